@@ -0,0 +1,54 @@
+#!/usr/bin/python3
+
+# Usage: benchmark-cardinality.py [rows] [cols]
+#
+# Reports the vars, clauses and generation time of each cardinality encoding
+# supported by generate-sat.py, for the --empty constraint over every cell of
+# a rows x cols board and the --lowerbound constraint over a list of words.
+
+import argparse
+import os
+import time
+
+from encoder import (Encoder, at_least_n_true, at_most_n_true,
+                     cardinality_encodings)
+
+def measure(constraint, nvars, n, encoding):
+    start = time.time()
+    with open(os.devnull, 'w') as out:
+        enc = Encoder(out, nvars)
+        constraint(enc, list(range(1, nvars+1)), n, encoding)
+    elapsed = time.time() - start
+    return enc.num_vars() - nvars, enc.num_clauses(), elapsed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Compare cardinality encodings used by generate-sat.py')
+    parser.add_argument('rows', type=int, nargs='?', default=21,
+                        help='number of rows (default: 21)')
+    parser.add_argument('cols', type=int, nargs='?', default=21,
+                        help='number of columns (default: 21)')
+    parser.add_argument('--empty', type=int, nargs='+',
+                        default=[0, 10, 20, 40, 80, 160],
+                        help='--empty values to measure')
+    parser.add_argument('--words', type=int, default=40,
+                        help='number of words for --lowerbound (default: 40)')
+    parser.add_argument('--lowerbound', type=int, nargs='+',
+                        default=[10, 20, 30, 35, 39],
+                        help='--lowerbound values to measure')
+    args = parser.parse_args()
+
+    encodings = ['sortnet'] + sorted(cardinality_encodings)
+    cells = args.rows * args.cols
+    runs = [('empty', at_most_n_true, cells, n) for n in args.empty] + \
+        [('lowerbound', at_least_n_true, args.words, n)
+         for n in args.lowerbound]
+
+    print('{:<11}{:>6}{:>8}  {:<14}{:>10}{:>10}{:>9}'.format(
+        'constraint', 'N', 'inputs', 'encoding', 'vars', 'clauses', 'secs'))
+    for name, constraint, nvars, n in runs:
+        for encoding in encodings:
+            if encoding == 'sortnet' and n >= nvars: continue
+            nv, nc, elapsed = measure(constraint, nvars, n, encoding)
+            print('{:<11}{:>6}{:>8}  {:<14}{:>10}{:>10}{:>9.3f}'.format(
+                name, n, nvars, encoding, nv, nc, elapsed))
@@ -0,0 +1,253 @@
+#!/usr/bin/python3
+
+# Usage: benchmark-suite.py [names...] [-o results.json] [--baseline old.json]
+#
+# Runs the tools in this repo on a fixed set of instances and records how long
+# generate-sat.py takes, its peak memory, the size of the CNF it writes, and
+# how long decode-solution.py and block-solution.py take on a solver output.
+# The solver output is made up from a recorded solution, so it doesn't depend
+# on how the CNF numbers its vars. If a solver is available, the time it takes
+# to solve the smaller instances is recorded too.
+#
+# Results are written as JSON. Given the results of an earlier run with
+# --baseline, each measurement is compared against it, and the exit code is 1
+# if anything got worse by more than --threshold.
+
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from solvers import solver_command
+from varmap import cnf_header, read_varmap
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Each benchmark generates a CNF for wordfile on a rows x cols board with the
+# given generate-sat.py flags. solution is a file of forces, in the format
+# decode-solution.py --format forces prints, that the made up solver output
+# sets; without one, every var in it is false. Only benchmarks with solve set
+# are run through the solver.
+BENCHMARKS = [
+    {'name': 'numbers-8x8', 'wordfile': 'data/numbers-10', 'rows': 8,
+     'cols': 8, 'flags': [], 'solution': 'benchmarks/numbers-10-8x8.forces',
+     'solve': True},
+    {'name': 'numbers-7x7', 'wordfile': 'data/numbers-10', 'rows': 7,
+     'cols': 7, 'flags': [], 'solve': True},
+    # Some words don't fit, so they have no placements.
+    {'name': 'numbers-4x4-lowerbound', 'wordfile': 'data/numbers-10',
+     'rows': 4, 'cols': 4, 'flags': ['--lowerbound', '3'], 'solve': True},
+    {'name': 'numbers-8x8-tree', 'wordfile': 'data/numbers-10', 'rows': 8,
+     'cols': 8, 'flags': ['--connectivity', 'tree', '--amo', 'sequential'],
+     'solution': 'benchmarks/numbers-10-8x8.forces', 'solve': True},
+    {'name': 'numbers-8x8-forced', 'wordfile': 'data/numbers-10', 'rows': 8,
+     'cols': 8,
+     'flags': ['--forcefile', 'benchmarks/numbers-10-8x8-partial.forces'],
+     'solution': 'benchmarks/numbers-10-8x8.forces', 'solve': True},
+    {'name': 'numbers-8x8-bounds', 'wordfile': 'data/numbers-10', 'rows': 8,
+     'cols': 8, 'flags': ['--lowerbound', '9', '--empty', '30',
+                          '--cardinality', 'totalizer'],
+     'solution': 'benchmarks/numbers-10-8x8.forces'},
+    {'name': 'presidents-38-17x17', 'wordfile': 'data/presidents-38',
+     'rows': 17, 'cols': 17, 'flags': []},
+    {'name': 'presidents-40-21x21-tree', 'wordfile': 'data/presidents-40',
+     'rows': 21, 'cols': 21,
+     'flags': ['--connectivity', 'tree', '--amo', 'sequential']},
+    {'name': 'presidents-38-17x17-gz', 'wordfile': 'data/presidents-38',
+     'rows': 17, 'cols': 17, 'flags': ['--connectivity', 'tree'],
+     'suffix': '.cnf.gz'},
+    {'name': 'presidents-40-21x21', 'wordfile': 'data/presidents-40',
+     'rows': 21, 'cols': 21, 'flags': []},
+]
+
+# Measurements compared against the baseline. Smaller is better for all of
+# them.
+METRICS = ['gen_secs', 'gen_rss_kb', 'cnf_bytes', 'vars', 'clauses',
+           'decode_secs', 'block_secs', 'solve_secs']
+
+# Times that differ from the baseline by less than this many seconds are
+# noise, whatever their ratio.
+TIME_SLACK = 0.1
+
+# Runs cmd from the repo's directory, returning its exit code, wall time and
+# peak RSS in KB. It's killed after timeout seconds, if given.
+def run(cmd, stdout=subprocess.DEVNULL, timeout=None):
+    env = dict(os.environ, PYTHONHASHSEED='0')
+    start = time.time()
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdout=stdout, env=env)
+    timer = None
+    if timeout is not None:
+        timer = threading.Timer(timeout, proc.kill)
+        timer.start()
+    pid, status, usage = os.wait4(proc.pid, 0)
+    elapsed = time.time() - start
+    if timer is not None: timer.cancel()
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return proc.returncode, elapsed, usage.ru_maxrss
+
+# Writes a solver output for cnf that sets the placements in solution_file
+# and nothing else.
+def fake_solver_output(cnf, nvars, solution_file, path):
+    true = set()
+    if solution_file is not None:
+        prog = re.compile('(.*):([HV])\\((\\d+),(\\d+)\\)')
+        wanted = set()
+        for line in open(os.path.join(ROOT, solution_file)):
+            m = prog.match(line.strip())
+            if m is None: continue
+            word, o, r, c = m.groups()
+            wanted.add((word, o, int(r), int(c)))
+        rows, cols, placements = read_varmap(cnf)
+        true = set(v for v, p in placements.items() if p in wanted)
+    with open(path, 'w') as f:
+        f.write('s SATISFIABLE\n')
+        lits = [v if v in true else -v for v in range(1, nvars+1)] + [0]
+        for i in range(0, len(lits), 20):
+            f.write('v ' + ' '.join(map(str, lits[i:i+20])) + '\n')
+
+def best_of(repeat, cmd):
+    times, rss = [], 0
+    for i in range(repeat):
+        code, elapsed, maxrss = run(cmd)
+        if code != 0: raise RuntimeError('%s failed' % ' '.join(cmd))
+        times.append(elapsed)
+        rss = max(rss, maxrss)
+    return min(times), rss
+
+def run_benchmark(bench, args):
+    cnf = os.path.join(args.workdir, bench['name'] + bench.get('suffix', '.cnf'))
+    result = {}
+    gen = [sys.executable, 'generate-sat.py', bench['wordfile'],
+           str(bench['rows']), str(bench['cols']), '-o', cnf] + bench['flags']
+    result['gen_secs'], result['gen_rss_kb'] = best_of(args.repeat, gen)
+    result['cnf_bytes'] = os.path.getsize(cnf)
+    result['vars'], result['clauses'] = cnf_header(cnf)
+
+    out = os.path.join(args.workdir, bench['name'] + '.out')
+    fake_solver_output(cnf, result['vars'], bench.get('solution'), out)
+    for tool in ('decode', 'block'):
+        cmd = [sys.executable, tool + '-solution.py', cnf, out]
+        result[tool + '_secs'], rss = best_of(args.repeat, cmd)
+
+    if args.solver is not None and bench.get('solve'):
+        with open(os.path.join(args.workdir, bench['name'] + '.solved'),
+                  'w') as f:
+            code, elapsed, rss = run(solver_command(args.solver, cnf), f,
+                                     args.timeout)
+        result['solve_secs'] = elapsed
+        result['result'] = {10: 'SAT', 20: 'UNSAT'}.get(code, 'unknown')
+        result['end_to_end_secs'] = result['gen_secs'] + elapsed
+    return result
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Prints each measurement next to its baseline, returning the number of
+# measurements that got worse by more than threshold.
+def compare(results, baseline, threshold):
+    worse = 0
+    print()
+    print('{:<26}{:<13}{:>14}{:>14}{:>9}'.format(
+        'benchmark', 'metric', 'baseline', 'current', 'ratio'))
+    for name, result in results.items():
+        old = baseline['benchmarks'].get(name)
+        if old is None: continue
+        for metric in METRICS:
+            if metric not in result or metric not in old: continue
+            a, b = old[metric], result[metric]
+            ratio = b / a if a else (1.0 if b == a else float('inf'))
+            note = ''
+            if metric.endswith('_secs') and abs(b - a) < TIME_SLACK:
+                pass
+            elif ratio > 1 + threshold:
+                note, worse = '  worse', worse + 1
+            elif ratio < 1 - threshold:
+                note = '  better'
+            print('{:<26}{:<13}{:>14.6g}{:>14.6g}{:>9.3f}{}'.format(
+                name, metric, a, b, ratio, note))
+        if None not in (old.get('result'), result.get('result')) and \
+           old['result'] != result['result']:
+            print('{:<26}result changed from {} to {}'.format(
+                name, old['result'], result['result']))
+            worse += 1
+    return worse
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark generating, decoding and solving wordcrosses')
+    parser.add_argument('names', nargs='*',
+                        help='benchmarks to run (default: all of them)')
+    parser.add_argument('-o', '--output', default='benchmark-results.json',
+                        help='where to write the results ' + \
+                        '(default: benchmark-results.json)')
+    parser.add_argument('--baseline',
+                        help='results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='how much worse than the baseline a ' + \
+                        'measurement can be (default: 0.1)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='run each tool this many times and keep the ' + \
+                        'fastest (default: 1)')
+    parser.add_argument('--solver', default='kissat -q',
+                        help='solver command line, or cdcl, pysat[:name] ' + \
+                        'or ipasir:<library>, for the benchmarks that ' + \
+                        'are solved (default: kissat -q if installed)')
+    parser.add_argument('--no-solve', action='store_true',
+                        help="don't run a solver")
+    parser.add_argument('--timeout', type=float, default=600,
+                        help='give up on solving after this many seconds ' + \
+                        '(default: 600)')
+    parser.add_argument('--workdir',
+                        help='keep CNFs and solver outputs here ' + \
+                        '(default: a temporary directory)')
+    args = parser.parse_args()
+
+    benchmarks = BENCHMARKS
+    if args.names:
+        known = set(b['name'] for b in BENCHMARKS)
+        for name in args.names:
+            if name not in known: parser.error('Unknown benchmark: ' + name)
+        benchmarks = [b for b in BENCHMARKS if b['name'] in args.names]
+    if args.no_solve or shutil.which(solver_command(args.solver, '')[0]) is None:
+        args.solver = None
+
+    keep = args.workdir is not None
+    if keep: os.makedirs(args.workdir, exist_ok=True)
+    else: args.workdir = tempfile.mkdtemp(prefix='bench-')
+
+    results = {}
+    print('{:<26}{:>9}{:>11}{:>13}{:>9}{:>9}{:>9}  {}'.format(
+        'benchmark', 'gen', 'rss MB', 'cnf MB', 'decode', 'block', 'solve',
+        'result'))
+    try:
+        for bench in benchmarks:
+            r = results[bench['name']] = run_benchmark(bench, args)
+            solve = '{:.2f}'.format(r['solve_secs']) if 'solve_secs' in r else '-'
+            print('{:<26}{:>9.2f}{:>11.1f}{:>13.1f}{:>9.2f}{:>9.2f}{:>9}  {}'.format(
+                bench['name'], r['gen_secs'], r['gen_rss_kb'] / 1024,
+                r['cnf_bytes'] / 1e6, r['decode_secs'], r['block_secs'],
+                solve, r.get('result', '')))
+            sys.stdout.flush()
+    finally:
+        if not keep: shutil.rmtree(args.workdir)
+
+    with open(args.output, 'w') as f:
+        json.dump({'commit': git_commit(), 'python': platform.python_version(),
+                   'platform': platform.platform(), 'solver': args.solver,
+                   'benchmarks': results}, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold) > 0: sys.exit(1)
@@ -1,24 +1,17 @@
 #!/usr/bin/python3
 
-# Usage: block-solution.py <cnf-file> <sat-solver-output-file>
+# Usage: block-solution.py <cnf-file> <sat-solver-output-file> [--varmap FILE]
 #
 # Finds a clause that blocks the solution in the solver output.
 
-import re
+import argparse
 import sys
 
-def extract_vars(filename):
-    # comments look like 'c var 1153 == ZERO at H(0,0)'
-    prog = re.compile('c var (\\d+) == \\w+ at [HV]\(\\d+,\\d+\)')
-    vs = set()
-    with open(filename) as f:
-        for line in f:
-            if line.startswith('p'): continue
-            if not line.startswith('c'): return vs
-            m = prog.match(line)
-            if m is None: continue
-            vs.add(m.groups()[0])
-    return vs
+from varmap import read_varmap
+
+def extract_vars(filename, varmap=None):
+    rows, cols, placements = read_varmap(filename, varmap)
+    return set(str(v) for v in placements)
 
 def strip_sat_solution(filename):
     pos = set()
@@ -37,10 +30,15 @@ def print_board(board):
         sys.stdout.write("\n")
 
 if __name__ == '__main__':
-    if len(sys.argv) < 3:
-        print('Usage: %s <cnf-file> <solver-output-file>' % sys.argv[0])
-        sys.exit(1)
-    cnf_file, solver_output_file = sys.argv[1:]
-    vs = extract_vars(cnf_file)
-    solution = strip_sat_solution(solver_output_file)
+    parser = argparse.ArgumentParser(
+        description='Print a clause that blocks a wordcross solution')
+    parser.add_argument('cnf_filename', type=str, help='input DIMACS file')
+    parser.add_argument('solution_filename', type=str,
+                        help='output of SAT solver')
+    parser.add_argument('--varmap',
+                        help='the placement var sidecar ' + \
+                        '(default: next to the CNF)')
+    args = parser.parse_args()
+    vs = extract_vars(args.cnf_filename, args.varmap)
+    solution = strip_sat_solution(args.solution_filename)
     print(' '.join([str(-int(x)) for x in vs & solution]) + ' 0')
@@ -0,0 +1,238 @@
+#!/usr/bin/python3
+
+# Usage: cube-board.py wordfile rows cols [--split N] [--parts P] [--corner]
+#                      [--solver SOLVER] [--workers N]
+#
+# Solves a hard board by cube and conquer: splits it into cubes, smaller
+# problems that together cover every solution, and solves as many of them at
+# once as there are cores. A cube fixes the orientation and a band of rows or
+# columns for each of the longest words, and with --corner, which words run
+# across and down from the top left corner. The first cube that's satisfiable
+# stops the others and its solution is printed. If every cube is
+# unsatisfiable, so is the board.
+#
+# The cubes share the base encoding, which is cached, and the constraints on
+# top of it, which are generated once; each solver gets those copied from
+# disk followed by the few clauses of its cube, through a pipe.
+#
+# The exit code is 10 if there's a solution, 20 if not, and 1 if a solver
+# failed and no other cube had a solution.
+
+import argparse
+import itertools
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor,
+                                as_completed)
+
+from encoder import (DimacsWriter, Encoder, add_encoding_arguments,
+                     load_cached_base, placement_cells, read_forces)
+from solvers import solver_command
+
+if hasattr(os, 'sched_getaffinity'):
+    CORES = len(os.sched_getaffinity(0))
+else:
+    CORES = os.cpu_count()
+
+# Returns the ways word can be placed, as (label, clauses) pairs: its
+# placements in each orientation, split into parts bands of rows for words
+# across and columns for words down, and not placing it at all if the
+# encoding doesn't require every word. t maps its placements to vars.
+def word_branches(word, t, parts, args):
+    bands = {}
+    for (o, r, c), v in t.items():
+        x, n = (r, args.rows) if o == 'H' else (c, args.cols)
+        bands.setdefault((o, x * parts // n), []).append((x, v))
+    branches = []
+    for (o, band), xs in sorted(bands.items()):
+        label = '%s:%s %s %d-%d' % (word, o, 'rows' if o == 'H' else 'cols',
+                                    min(xs)[0], max(xs)[0])
+        branches.append((label, [[v for x, v in xs]]))
+    if args.lowerbound is not None:
+        branches.append(('%s unplaced' % word, [[-v] for v in t.values()]))
+    return branches
+
+# Returns the ways words can start at the top left corner, as (label,
+# clauses) pairs: a word across, a word down, both or neither. Words across
+# and down can only share it if they're different words with the same first
+# letter.
+def corner_branches(placements):
+    starts = dict((o, [(w, t[(o, 0, 0)])
+                       for w, t in sorted(placements.items())
+                       if (o, 0, 0) in t])
+                  for o in 'HV')
+    branches = []
+    for h, v in itertools.product(starts['H'] + [None], starts['V'] + [None]):
+        if h is not None and v is not None and \
+           (h[0] == v[0] or h[0][0] != v[0][0]):
+            continue
+        labels, clauses = [], []
+        for o, start in (('H', h), ('V', v)):
+            if start is not None:
+                labels.append('%s:%s(0,0)' % (start[0], o))
+                clauses.append([start[1]])
+            else:
+                labels.append('no word %s at (0,0)' %
+                              ('across' if o == 'H' else 'down'))
+                clauses += [[-var] for w, var in starts[o]]
+        branches.append((', '.join(labels), clauses))
+    return branches
+
+# Returns the cubes, as (label, clauses) pairs. Every combination of one
+# branch from each split is a cube, so the cubes cover every solution. Words
+# that don't fit anywhere aren't worth splitting on.
+def make_cubes(placements, forces, args):
+    free = [w for w, t in placements.items()
+            if w not in forces and len(t) > 0]
+    longest = sorted(free, key=lambda w: (-len(w), w))[:args.split]
+    splits = [word_branches(w, placements[w], args.parts, args)
+              for w in longest]
+    if args.corner:
+        splits.append(corner_branches(placements))
+    return [(', '.join(label for label, clauses in cube),
+             [c for label, clauses in cube for c in clauses])
+            for cube in itertools.product(*splits)]
+
+# Writes a cube's CNF to the pipe f: the shared files, then its clauses.
+def feed(f, shared, counts, clauses):
+    try:
+        out = DimacsWriter(raw=f, counts=counts)
+        for path in shared: out.copy_from(path)
+        for clause in clauses: out.write(' '.join(map(str, clause)) + ' 0\n')
+        out.close(*counts)
+        f.close()
+    except BrokenPipeError:
+        pass  # the solver quit early or was stopped
+
+# Solves a cube, returning the solver's exit code and the vars that are true
+# in its solution, or None if stop is set before the solver finishes.
+# running holds the solvers that are running, so they can be stopped.
+def solve_cube(cube, shared, counts, args, running, lock, stop):
+    with lock:
+        if stop.is_set(): return None, []
+        proc = subprocess.Popen(solver_command(args.solver),
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        running.add(proc)
+    label, clauses = cube
+    feeder = threading.Thread(target=feed, args=(
+        proc.stdin, shared, (counts[0], counts[1] + len(clauses)), clauses))
+    feeder.start()
+    true = []
+    for line in proc.stdout:
+        if line.startswith(b'v '):
+            true.extend(int(x) for x in line[2:].split()
+                        if x[:1] != b'-' and x != b'0')
+    code = proc.wait()
+    feeder.join()
+    with lock:
+        running.discard(proc)
+        if stop.is_set() and code not in (10, 20): return None, []
+    return code, true
+
+def print_board(placed, rows, cols):
+    board = [[' ' for i in range(cols)] for i in range(rows)]
+    for word, o, r, c in placed:
+        for r2, c2, ch in placement_cells(word, (o, r, c)):
+            board[r2][c2] = ch
+    for row in board:
+        print(''.join(row))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Solve a wordcross problem by cube and conquer')
+    parser.add_argument('wordfile', type=str, help='input words, one per line')
+    parser.add_argument('rows', type=int, help='number of rows')
+    parser.add_argument('cols', type=int, help='number of columns')
+    add_encoding_arguments(parser)
+    parser.add_argument('--split', type=int, default=3,
+                        help='split on this many of the longest words ' + \
+                        'that aren\'t forced (default: 3)')
+    parser.add_argument('--parts', type=int, default=2,
+                        help='split the rows or columns of each of those ' + \
+                        'words into this many bands (default: 2)')
+    parser.add_argument('--corner', action='store_true',
+                        help='also split on the words across and down ' + \
+                        'from the top left corner')
+    parser.add_argument('--solver', default='kissat -q',
+                        help='solver command line, or cdcl, pysat[:name] ' + \
+                        'or ipasir:<library> (default: kissat -q)')
+    parser.add_argument('--workers', type=int,
+                        default=CORES,
+                        help='solve this many cubes at once ' + \
+                        '(default: the number of cores)')
+    parser.add_argument('--list', action='store_true',
+                        help="print the cubes and stop, without solving them")
+    parser.add_argument('--format', choices=['ascii','forces'],
+                        default='ascii')
+    args = parser.parse_args()
+
+    words = [w.strip() for w in open(args.wordfile) if len(w.strip()) > 0]
+    forces, relforces = read_forces(args)
+    if args.symmetry and (forces or relforces):
+        parser.error("--symmetry can't be used with forces")
+
+    start = time.time()
+    workdir = tempfile.TemporaryDirectory()
+    cache = args.cache or os.path.join(workdir.name, 'cache')
+    constraints = os.path.join(workdir.name, 'constraints.cnf')
+    pool = ProcessPoolExecutor(args.jobs) if args.jobs > 1 else None
+    with open(constraints, 'w') as f:
+        enc = Encoder(f, pool=pool)
+        base = load_cached_base(enc, cache, words, args)
+        enc.encode_constraints(forces, relforces, args)
+    if pool is not None: pool.shutdown()
+    placements = enc.base['placement_vars']
+    cubes = make_cubes(placements, forces, args)
+    if args.list:
+        for i, (label, clauses) in enumerate(cubes):
+            print('%d: %s' % (i + 1, label))
+        sys.exit(0)
+    sys.stderr.write('c generated %d cubes in %.2fs\n' %
+                     (len(cubes), time.time() - start))
+
+    shared, counts = [base, constraints], (enc.num_vars(), enc.num_clauses())
+    running, lock, stop = set(), threading.Lock(), threading.Event()
+    solution, results = None, {10: 0, 20: 0, 'failed': 0, None: 0}
+    with ThreadPoolExecutor(args.workers) as workers:
+        futures = dict((workers.submit(solve_cube, cube, shared, counts, args,
+                                       running, lock, stop), i)
+                       for i, cube in enumerate(cubes))
+        try:
+            for future in as_completed(futures):
+                i = futures[future]
+                code, true = future.result()
+                results[code if code in (10, 20, None) else 'failed'] += 1
+                if code is None: continue
+                status = {10: 'SAT', 20: 'UNSAT'}.get(code,
+                                                      'failed with %d' % code)
+                sys.stderr.write('c cube %d %s in %.2fs: %s\n' %
+                                 (i + 1, status, time.time() - start,
+                                  cubes[i][0]))
+                if code == 10 and solution is None:
+                    solution = true
+                    with lock:
+                        stop.set()
+                        for proc in running: proc.kill()
+        finally:
+            with lock:
+                stop.set()
+                for proc in running: proc.kill()
+    sys.stderr.write('c %d cubes: %d SAT, %d UNSAT, %d failed, %d stopped '
+                     'in %.2fs\n' % (len(cubes), results[10], results[20],
+                                     results['failed'], results[None],
+                                     time.time() - start))
+
+    if solution is not None:
+        byvar = dict((v, (w,) + p) for w, t in placements.items()
+                     for p, v in t.items())
+        placed = sorted(byvar[v] for v in solution if v in byvar)
+        if args.format == 'ascii':
+            print_board(placed, args.rows, args.cols)
+        else:
+            for p in placed: print('%s:%s(%d,%d)' % p)
+        sys.exit(10)
+    sys.exit(20 if results[20] == len(cubes) else 1)
@@ -1,33 +1,26 @@
 #!/usr/bin/python3
 
-# Usage: decode-solution.py <cnf-file> <sat-solver-output-file>
+# Usage: decode-solution.py <cnf-file> <sat-solver-output-file> [rows cols]
+#                           [--varmap FILE]
 
 import argparse
 import itertools
-import re
 import sys
 
-def extract_coords(filename):
-    # comments look like 'c var 1153 == ZERO at H(0,0)'
-    prog = re.compile('c var (\\d+) == ([\\w\\s]+) at ([HV])\((\\d+),(\\d+)\)')
+from varmap import read_varmap
+
+def extract_coords(filename, varmap=None):
+    rows, cols, placements = read_varmap(filename, varmap)
     mapping = {}
     forces = {}
-    with open(filename) as f:
-        for line in f:
-            if line.startswith('p'): continue
-            if not line.startswith('c'): return mapping, forces
-            m = prog.match(line)
-            if m is None: continue
-            # m is of the form ('1153','ZERO','H','0','0')
-            groups = m.groups()
-            forces[int(groups[0])] = ("%s:%s(%s,%s)" % groups[1:])
-            r, c = int(groups[3]), int(groups[4])
-            coords = []
-            for i, ch in enumerate(groups[1]):
-                if groups[2] == 'H': coords.append((r,c+i,ch))
-                elif groups[2] == 'V': coords.append((r+i,c,ch))
-            mapping[int(groups[0])] = coords
-    return mapping, forces
+    for v, (word, o, r, c) in placements.items():
+        forces[v] = "%s:%s(%d,%d)" % (word, o, r, c)
+        coords = []
+        for i, ch in enumerate(word):
+            if o == 'H': coords.append((r,c+i,ch))
+            elif o == 'V': coords.append((r+i,c,ch))
+        mapping[v] = coords
+    return mapping, forces, rows, cols
 
 def strip_sat_solution(filename):
     pos = []
@@ -65,15 +58,24 @@ if __name__ == '__main__':
     parser.add_argument('cnf_filename', type=str, help='input DIMACS file')
     parser.add_argument('solution_filename', type=str,
                         help='output of SAT solver')
-    parser.add_argument('rows', type=int, help='number of rows')
-    parser.add_argument('cols', type=int, help='number of columns')
+    parser.add_argument('rows', type=int, nargs='?',
+                        help='number of rows (default: from the CNF sidecar)')
+    parser.add_argument('cols', type=int, nargs='?',
+                        help='number of columns (default: from the CNF sidecar)')
     parser.add_argument('--format', choices=['ascii','forces','relative'],
                         default='ascii',)
+    parser.add_argument('--varmap',
+                        help='the placement var sidecar ' + \
+                        '(default: next to the CNF)')
     args = parser.parse_args()
 
-    coords, raw_forces = extract_coords(args.cnf_filename)
+    coords, raw_forces, rows, cols = extract_coords(args.cnf_filename,
+                                                    args.varmap)
+    if args.rows is not None: rows, cols = args.rows, args.cols
+    if rows is None or cols is None:
+        parser.error('rows and cols are required without a CNF sidecar')
     solution = strip_sat_solution(args.solution_filename)
-    board = [[' ' for i in range(args.cols)] for i in range(args.rows)]
+    board = [[' ' for i in range(cols)] for i in range(rows)]
     forces = []
     for val in solution:
         if raw_forces.get(val) is not None:
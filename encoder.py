@@ -0,0 +1,1416 @@
+# Encodes wordcross puzzles as SAT.
+#
+# An Encoder owns the var and clause counters and the output for one CNF. The
+# encoding comes in two parts: the base, which only depends on the words, the
+# board and the encoding options, and the constraints added on top of it by
+# forces, relative forces, --lowerbound and --empty. Since the base is by far
+# the larger part, it can be cached on disk and reused while iterating on
+# forces and bounds for the same board.
+
+import fcntl
+import functools
+import gzip
+import hashlib
+import itertools
+import json
+import lzma
+import math
+import os
+import re
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from array import array
+from collections import defaultdict
+from collections.abc import Mapping
+
+class Encoder:
+    def __init__(self, out, nvars=0, nclauses=0, pool=None):
+        self.out = out
+        self.vc, self.cc, self.lc = nvars, nclauses, 0
+        self.base = None
+        self.pool, self.shards = pool, []
+        self.stats, self.family_name = None, None
+
+    def new_var(self): self.vc += 1; return self.vc
+    def num_vars(self): return self.vc
+    def ensure_vars(self, nv): self.vc = nv
+
+    def write_clause(self, c):
+        self.out.write(" ".join(map(str, c)) + " 0\n")
+        self.cc += 1
+        self.lc += len(c)
+    def num_clauses(self): return self.cc
+    def num_literals(self): return self.lc
+
+    # Starts recording the vars, clauses, literals and seconds spent on each
+    # constraint family in stats, a dict from family names to those four
+    # numbers. Anything generated outside of a family is recorded as 'other'.
+    def record_stats(self):
+        self.stats = {}
+        self.mark = self.counts()
+
+    def counts(self): return (self.vc, self.cc, self.lc, time.time())
+    STATS_FIELDS = ('vars', 'clauses', 'literals', 'secs')
+
+    def add_stats(self, family, deltas):
+        totals = self.stats.setdefault(family, [0, 0, 0, 0.0])
+        for i, d in enumerate(deltas): totals[i] += d
+
+    # Records everything generated since the last call in the current family.
+    def charge(self):
+        if self.stats is None: return
+        now = self.counts()
+        deltas = [b - a for a, b in zip(self.mark, now)]
+        if self.family_name is not None or any(deltas[:3]):
+            self.add_stats(self.family_name or 'other', deltas)
+        self.mark = now
+
+    # Records everything generated from here on, including shards started
+    # from here on, in family name.
+    def begin_family(self, name):
+        self.charge()
+        self.family_name = name
+
+    # Comments are written to the CNF as they're added.
+    def add_comment(self, c):
+        self.out.write('c {}\n'.format(c))
+
+    # Calls func(enc, *args), which must allocate exactly nvars vars, giving
+    # it the next nvars vars. With a pool, func runs in a worker that writes
+    # its clauses to a shard file, and join_shards() appends the shards to
+    # the output once they're done. Since the var ranges are fixed up front,
+    # the result is the same as without a pool up to the order of clauses.
+    def shard(self, nvars, func, *args):
+        if self.pool is None:
+            first = self.vc + 1
+            func(self, *args)
+            check_shard(func, first, nvars, self.vc)
+        else:
+            shard = self.pool.submit(run_shard, self.vc + 1, nvars, func, args)
+            self.shards.append((self.family_name, shard))
+            self.vc += nvars
+
+    # The clauses and time of each shard are recorded in the family it was
+    # started in, with the time being the worker's.
+    def join_shards(self):
+        self.charge()
+        while self.shards:
+            family, shard = self.shards[0]
+            path, nclauses, nliterals, secs = shard.result()
+            self.shards.pop(0)
+            try:
+                append_file(self.out, path)
+            finally:
+                os.remove(path)
+            self.cc += nclauses
+            self.lc += nliterals
+            if self.stats is not None:
+                self.add_stats(family or 'other', [0, nclauses, nliterals, secs])
+        if self.stats is not None:
+            self.mark = self.counts()[:3] + self.mark[3:]
+
+    # Cancels the shards that haven't been joined and removes the files of
+    # the ones that have finished, so that a failed encoding doesn't leave
+    # them behind.
+    def discard_shards(self):
+        shards, self.shards = self.shards, []
+        for family, shard in shards:
+            if shard.cancel(): continue
+            try:
+                path = shard.result()[0]
+            except BaseException:
+                continue  # the worker removed its own file
+            os.remove(path)
+
+    # Encodes everything: the base, pruned by forces and relforces when
+    # prune is true, and the constraints on top of it.
+    def encode(self, words, forces, relforces, args, prune=True):
+        self.encode_base(words, forces, relforces, args, prune)
+        self.encode_constraints(forces, relforces, args)
+
+    def encode_base(self, words, forces, relforces, args, prune=True):
+        try:
+            self.base = generate_word_placements(self, words, forces,
+                                                 relforces, args, prune)
+        except BaseException:
+            self.discard_shards()
+            raise
+
+    def encode_constraints(self, forces, relforces, args):
+        generate_constraints(self, self.base, forces, relforces, args)
+
+    # Saves the counters and the base's vars so that the base can be reused
+    # by load_base() with an output that already holds its clauses.
+    def save_base(self, path):
+        b = self.base
+        state = {
+            'nvars': self.vc, 'nclauses': self.cc, 'nliterals': self.lc,
+            'words': b['words'], 'used': b['used'], 'roots': b['roots'],
+            'rows': b['rows'], 'cols': b['cols'],
+            'placements': [[w, t.first, t.codes.tolist()]
+                           for w, t in b['placement_vars'].items()],
+            'cells': [[r, c, b['hvar'][(r,c)], b['vvar'][(r,c)]]
+                      for (r, c) in b['hvar']],
+        }
+        with open(path, 'w') as f:
+            json.dump(state, f, separators=(',', ':'))
+
+    def load_base(self, path):
+        with open(path) as f:
+            state = json.load(f)
+        self.vc, self.cc, self.lc = \
+            state['nvars'], state['nclauses'], state['nliterals']
+        rows, cols = state['rows'], state['cols']
+        placement_vars = dict((w, PlacementTable(w, rows, cols, codes, first))
+                              for w, first, codes in state['placements'])
+        self.base = {
+            'words': state['words'], 'used': state['used'],
+            'rows': rows, 'cols': cols,
+            'roots': state['roots'], 'placement_vars': placement_vars,
+            'hvar': dict(((r, c), h) for r, c, h, v in state['cells']),
+            'vvar': dict(((r, c), v) for r, c, h, v in state['cells']),
+        }
+
+def check_shard(func, first, nvars, last):
+    if last - first + 1 != nvars:
+        raise ValueError('%s allocated %d vars instead of %d' %
+                         (func.__name__, last - first + 1, nvars))
+
+# Writes the stats recorded by an Encoder to f as a table, in the order the
+# families were generated in.
+def write_stats(stats, f):
+    total = [sum(s[i] for s in stats.values()) for i in range(4)]
+    f.write('{:<24}{:>10}{:>11}{:>12}{:>9}{:>10}\n'.format(
+        'family', 'vars', 'clauses', 'literals', 'secs', '%clauses'))
+    for name, (nv, nc, nl, secs) in list(stats.items()) + [('total', total)]:
+        share = 100.0 * nc / total[1] if total[1] else 0.0
+        f.write('{:<24}{:>10}{:>11}{:>12}{:>9.3f}{:>10.1f}\n'.format(
+            name, nv, nc, nl, secs, share))
+
+def stats_json(stats):
+    return dict((name, dict(zip(Encoder.STATS_FIELDS, s)))
+                for name, s in stats.items())
+
+# Runs a shard in a pool worker, returning the shard file's path, the number
+# of clauses and literals in it and the time it took.
+def run_shard(first, nvars, func, args):
+    start = time.time()
+    fd, path = tempfile.mkstemp(prefix='shard-', suffix='.cnf')
+    try:
+        with os.fdopen(fd, 'w') as out:
+            enc = Encoder(out, first - 1)
+            func(enc, *args)
+        check_shard(func, first, nvars, enc.num_vars())
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, enc.num_clauses(), enc.num_literals(), time.time() - start
+
+# Appends the file at path to out, a DimacsWriter or a text file.
+def append_file(out, path):
+    if isinstance(out, DimacsWriter):
+        out.copy_from(path)
+        return
+    with open(path) as f:
+        shutil.copyfileobj(f, out, 1 << 20)
+
+# Bump this whenever the base encoding changes, to invalidate caches.
+CACHE_VERSION = 3
+
+# Starts enc, a new Encoder, with the base encoding for words and args,
+# reusing it from cache_dir if it's been generated before. The cached base
+# isn't pruned by forces, which are added later as plain constraints.
+def cached_base(enc, cache_dir, words, args):
+    append_file(enc.out, load_cached_base(enc, cache_dir, words, args))
+
+# Like cached_base, but only loads the base's counters and vars into enc,
+# returning the path of the file holding its clauses.
+def load_cached_base(enc, cache_dir, words, args):
+    key = json.dumps([CACHE_VERSION, words, args.rows, args.cols, args.extra,
+                      args.connectivity, args.amo])
+    base = os.path.join(cache_dir, hashlib.sha256(key.encode()).hexdigest())
+    if not os.path.exists(base + '.json'):
+        os.makedirs(cache_dir, exist_ok=True)
+        out = enc.out
+        with open(base + '.cnf.tmp', 'w') as f:
+            enc.out = f
+            enc.encode_base(words, {}, [], args, prune=False)
+        enc.out = out
+        os.replace(base + '.cnf.tmp', base + '.cnf')
+        enc.save_base(base + '.json.tmp')
+        os.replace(base + '.json.tmp', base + '.json')
+    enc.begin_family('cached base')
+    if enc.base is None: enc.load_base(base + '.json')
+    return base + '.cnf'
+
+# An xz stream holding data in a single uncompressed LZMA2 chunk, so that its
+# size only depends on the size of data. lzma.compress can't guarantee that.
+def xz_uncompressed_stream(data):
+    def crc32(b): return struct.pack('<I', zlib.crc32(b))
+    def pad4(b): return b + b'\0' * (-len(b) % 4)
+    def varint(n):
+        out = b''
+        while n >= 0x80: out, n = out + bytes([(n & 0x7f) | 0x80]), n >> 7
+        return out + bytes([n])
+    flags = b'\0\x01'  # CRC32 check
+    # Block header: one LZMA2 filter with a 4KiB dictionary.
+    block_header = pad4(b'\x02\x00\x21\x01\x00')
+    block_header += crc32(block_header)
+    chunk = b'\x01' + struct.pack('>H', len(data)-1) + data + b'\0'
+    block = pad4(block_header + chunk) + crc32(data)
+    index = b'\0' + varint(1) + varint(len(block_header) + len(chunk) + 4)
+    index = pad4(index + varint(len(data)))
+    index += crc32(index)
+    footer = struct.pack('<I', len(index)//4 - 1) + flags
+    return (b'\xfd7zXZ\0' + flags + crc32(flags) + block + index +
+            crc32(footer) + footer + b'YZ')
+
+# Buffered DIMACS output to a file, or stdout if path is None. The header
+# isn't known until everything's been generated, so a fixed-width header is
+# reserved at the start of the file and filled in by close(). The 'p' line
+# itself isn't padded, since strict readers want it exactly as DIMACS says;
+# the slack goes on a comment line after it instead. Paths ending in
+# .gz or .xz are compressed; the header is then a separate, uncompressed gzip
+# member or xz stream of fixed size, which is valid since both formats allow
+# concatenation.
+# Output to a pipe can't be patched, so it's spooled to a temporary file,
+# unless the counts are given up front.
+class DimacsWriter:
+    HEADER_WIDTH = 48
+    BUFFER_CHARS = 1 << 21
+
+    # Writes to path, or to stdout. Given the counts of vars and clauses up
+    # front, the header is written right away instead of being filled in by
+    # close(), so the output can be a pipe, like raw.
+    def __init__(self, path=None, raw=None, counts=None):
+        self.path, self.lines, self.spool = path, [], None
+        self.buffered, self.counts = 0, counts
+        if raw is not None:
+            self.raw = raw
+        elif path is None:
+            self.raw = sys.stdout.buffer
+        else:
+            self.raw = open(path, 'wb')
+        if counts is not None:
+            self.raw.write('p cnf {} {}\n'.format(*counts).encode())
+            self.out = self.raw
+            return
+        if path is None and not self.patchable(self.raw):
+            self.spool = tempfile.TemporaryFile()
+        self.start = self.raw.tell() if self.spool is None else None
+        if self.spool is not None:
+            self.out = self.spool
+        elif path is not None and path.endswith('.gz'):
+            self.raw.write(self.header(0, 0))
+            self.out = gzip.GzipFile(fileobj=self.raw, mode='wb', mtime=0)
+        elif path is not None and path.endswith('.xz'):
+            self.raw.write(self.header(0, 0))
+            self.out = lzma.LZMAFile(self.raw, mode='wb')
+        else:
+            self.raw.write(self.header(0, 0))
+            self.out = self.raw
+
+    @staticmethod
+    def patchable(f):
+        try:
+            if not f.seekable(): return False
+            return not fcntl.fcntl(f.fileno(), fcntl.F_GETFL) & os.O_APPEND
+        except (OSError, ValueError):
+            return False
+
+    def header(self, nv, nc):
+        line = 'p cnf {} {}'.format(nv, nc)
+        if self.spool is not None:
+            return (line + '\n').encode()
+        line = line + '\n' + 'c'.ljust(self.HEADER_WIDTH - len(line) - 1)
+        line = (line + '\n').encode()
+        if self.path is not None and self.path.endswith('.gz'):
+            return gzip.compress(line, compresslevel=0, mtime=0)
+        if self.path is not None and self.path.endswith('.xz'):
+            return xz_uncompressed_stream(line)
+        return line
+
+    def write(self, line):
+        self.lines.append(line)
+        self.buffered += len(line)
+        if self.buffered >= self.BUFFER_CHARS: self.flush()
+
+    def flush(self):
+        self.out.write(''.join(self.lines).encode())
+        self.lines, self.buffered = [], 0
+
+    # Copies the contents of another file, like a cached base encoding.
+    def copy_from(self, path):
+        self.flush()
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, self.out, 1 << 20)
+
+    def close(self, nv, nc):
+        self.flush()
+        if self.spool is not None:
+            self.raw.write(self.header(nv, nc))
+            self.spool.seek(0)
+            shutil.copyfileobj(self.spool, self.raw)
+            self.spool.close()
+        elif self.counts is None:
+            if self.out is not self.raw: self.out.close()
+            self.raw.seek(self.start)
+            self.raw.write(self.header(nv, nc))
+        self.raw.flush()
+        if self.path is not None: self.raw.close()
+
+# Makes v true iff disjunction of vars in d is true
+def disjunction_witness(enc, d, v=None):
+    if v is None:
+        v = enc.new_var()
+    enc.write_clause([dv for dv in d] + [-v])
+    for dv in d:
+        enc.write_clause([v, -dv])
+    return v
+
+# Makes v true iff conjunction of vars in c is true
+def conjunction_witness(enc, c, v=None):
+    if v is None:
+        v = enc.new_var()
+    enc.write_clause([-cv for cv in c] + [v])
+    for cv in c:
+        enc.write_clause([-v, cv])
+    return v
+
+# Generates clauses satisfiable iff exactly one of the variables in vs is true.
+def exactly_one_true(enc, vs, encoding='pairwise'):
+    vvs = tuple(v for v in vs)
+    return [vvs] + at_most_one_true(enc, vvs, encoding)
+
+# Generates clauses satisfiable iff at most one of the variables in vs is true.
+def at_most_one_true(enc, vs, encoding='pairwise'):
+    vvs = tuple(v for v in vs)
+    if len(vvs) <= AMO_PAIRWISE_MAX: encoding = 'pairwise'
+    return amo_encodings[encoding](enc, vvs)
+
+# At-most-one constraints over this many vars or fewer are always pairwise,
+# since the other encodings don't save anything at that size.
+AMO_PAIRWISE_MAX = 4
+
+def pairwise_amo(enc, vs):
+    return [(-x,-y) for x,y in itertools.combinations(vs, 2)]
+
+# Sinz's sequential counter: s[i] is true if one of vs[0..i] is true.
+def sequential_amo(enc, vs):
+    s = [enc.new_var() for i in range(len(vs)-1)]
+    clauses = [(-vs[0], s[0])]
+    for i in range(1, len(vs)-1):
+        clauses += [(-vs[i], s[i]), (-s[i-1], s[i]), (-vs[i], -s[i-1])]
+    clauses.append((-vs[-1], -s[-1]))
+    return clauses
+
+# Klieber and Kwon's commander encoding: split vs into groups of 3, each with
+# a commander var that's implied by every var in its group, then recursively
+# require at most one commander.
+def commander_amo(enc, vs):
+    clauses, commanders = [], []
+    for i in range(0, len(vs), 3):
+        group = vs[i:i+3]
+        clauses += pairwise_amo(enc, group)
+        c = enc.new_var()
+        commanders.append(c)
+        clauses += [(-x, c) for x in group]
+    return clauses + at_most_one_true(enc, commanders, 'commander')
+
+# Chen's 2-product encoding: arrange vs in a p x q grid, have each var imply
+# its row and column vars, then recursively require at most one row and at
+# most one column.
+def product_amo(enc, vs):
+    p = math.ceil(math.sqrt(len(vs)))
+    q = math.ceil(len(vs) / p)
+    us = [enc.new_var() for i in range(p)]
+    ws = [enc.new_var() for j in range(q)]
+    clauses = []
+    for k, x in enumerate(vs):
+        clauses += [(-x, us[k // q]), (-x, ws[k % q])]
+    return clauses + at_most_one_true(enc, us, 'product') + \
+        at_most_one_true(enc, ws, 'product')
+
+amo_encodings = {
+    'pairwise': pairwise_amo,
+    'sequential': sequential_amo,
+    'commander': commander_amo,
+    'product': product_amo,
+}
+
+# The number of auxiliary vars an at-most-one constraint over n vars needs.
+@functools.lru_cache(maxsize=None)
+def amo_vars(n, encoding):
+    enc = Encoder(None, n)
+    at_most_one_true(enc, range(1, n+1), encoding)
+    return enc.num_vars() - n
+
+# Generates clauses satisfiable iff at most one of the variables in vs is false.
+def at_most_one_false(vs):
+    vvs = tuple(v for v in vs)
+    return [(x,y) for x,y in itertools.combinations(vvs, 2)]
+
+# Given variables a, b, minout, and maxout, generates clauses that are
+# satisfiable iff minout = min(a,b) and maxout = max(a,b).
+def comparator(a, b, minout, maxout):
+    return [(-maxout, a, b), (-a, maxout), (-b, maxout),
+            (minout, -a, -b), (a, -minout), (b, -minout)]
+
+def apply_comparator(enc, vin, i, j):
+    newmin, newmax = enc.new_var(), enc.new_var()
+    for clause in comparator(vin[i], vin[j], newmin, newmax):
+        enc.write_clause(clause)
+    #vin[i], vin[j] = newmin, newmax
+    vin[i], vin[j] = newmax, newmin
+
+def pairwise_sorting_network(enc, vin, begin, end):
+    n, a = end - begin, 1
+    while a < n:
+        b, c = a, 0
+        while b < n:
+            apply_comparator(enc, vin, begin+b-a, begin+b)
+            b, c = b+1, (c+1) % a
+            if c == 0: b += a
+        a *= 2
+
+    a //= 4
+    e = 1
+    while a > 0:
+        d = e
+        while d > 0:
+            b = (d+1) * a
+            c = 0
+            while b < n:
+                apply_comparator(enc, vin, begin+b-d*a, begin+b)
+                b, c = b+1, (c+1) % a
+                if c == 0: b += a
+            d //= 2
+        a //= 2
+        e = e*2 + 1
+
+# Filter [vin[i], vin[i+n]) with [vin[j], vin[j+n)
+def filter_network(enc, vin, i, j, n):
+    for x in range(n):
+        apply_comparator(enc, vin, i+x, j+n-1-x)
+
+# Assert that exactly n of the vars in vin are true.
+def exactly_n_true(enc, vin, n, encoding='sortnet'):
+    n_true(enc, vin, n, True, True, encoding)
+
+def at_most_n_true(enc, vin, n, encoding='sortnet'):
+    n_true(enc, vin, n, True, False, encoding)
+
+def at_least_n_true(enc, vin, n, encoding='sortnet'):
+    n_true(enc, vin, n, False, True, encoding)
+
+def n_true(enc, vin, n, at_most_n_true, at_least_n_true, encoding='sortnet'):
+    if encoding != 'sortnet':
+        # The other encodings only bound the count from above. At least n of
+        # vin are true iff at most len(vin)-n of their negations are true.
+        def at_most(vs, k):
+            if k == 0:
+                for v in vs: enc.write_clause([-v])
+            else:
+                cardinality_encodings[encoding](enc, vs, k)
+        if at_most_n_true:
+            at_most(vin, n)
+        if at_least_n_true:
+            if n > len(vin):
+                enc.write_clause([])
+                return
+            at_most([-v for v in vin], len(vin)-n)
+        return
+    if n == 0:
+        if at_least_n_true: return
+        for v in vin:
+            enc.write_clause((-v,))
+        return
+    n = n+1  # We'll select the top n+1, verify exactly one true.
+    batches = len(vin) // n
+    for b in range(1, batches):
+        pairwise_sorting_network(enc, vin, 0, n)
+        pairwise_sorting_network(enc, vin, b*n, (b+1)*n)
+        filter_network(enc, vin, 0, b*n, n)
+    # Now take care of the remainder, if there is one.
+    rem = len(vin) - batches * n
+    if rem > 0:
+        pairwise_sorting_network(enc, vin, 0, n)
+        pairwise_sorting_network(enc, vin, batches*n, len(vin))
+        filter_network(enc, vin, n-rem, batches*n, rem)
+    if at_least_n_true:
+        # Assert that at most 1 of the first n are false
+        for clause in at_most_one_false(vin[:n]):
+            enc.write_clause(clause)
+    if at_most_n_true:
+        # Assert that at least 1 of the first n are false
+        enc.write_clause([-v for v in vin[:n]])
+
+# Sinz's sequential counter: s[i][j] is true if at least j+1 of vs[0..i]
+# are true.
+def sequential_at_most(enc, vs, k):
+    if k >= len(vs): return
+    s = [[enc.new_var() for j in range(k)] for i in range(len(vs)-1)]
+    for i, x in enumerate(vs):
+        if i > 0:
+            enc.write_clause([-x, -s[i-1][k-1]])
+        if i == len(vs)-1: break
+        enc.write_clause([-x, s[i][0]])
+        if i == 0:
+            for j in range(1, k): enc.write_clause([-s[i][j]])
+            continue
+        for j in range(k):
+            enc.write_clause([-s[i-1][j], s[i][j]])
+            if j > 0: enc.write_clause([-x, -s[i-1][j-1], s[i][j]])
+
+# Bailleux and Boufkhad's totalizer: a binary tree of unary counters, where
+# out[i] is true if at least i+1 of the node's inputs are true. Counters are
+# truncated at k+1 since we only need to know whether the count exceeds k.
+def totalizer_at_most(enc, vs, k):
+    if k >= len(vs): return
+    def count(vs):
+        if len(vs) == 1: return [vs[0]]
+        a, b = count(vs[:len(vs)//2]), count(vs[len(vs)//2:])
+        out = [enc.new_var() for i in range(min(len(a)+len(b), k+1))]
+        for i in range(len(a)+1):
+            for j in range(len(b)+1):
+                if i+j == 0: continue
+                clause = [out[min(i+j, k+1)-1]]
+                if i > 0: clause.append(-a[i-1])
+                if j > 0: clause.append(-b[j-1])
+                enc.write_clause(clause)
+        return out
+    enc.write_clause([-count(vs)[k]])
+
+# Ogawa et al.'s modulo totalizer: like the totalizer, but each node counts
+# in base m, with a unary counter lower for the count mod m, a unary counter
+# upper for the count div m, and a carry between them. Needs O(n sqrt(k))
+# clauses instead of O(nk).
+def modulo_totalizer_at_most(enc, vs, k):
+    if k >= len(vs): return
+    m = max(2, math.ceil(math.sqrt(k+1)))
+    qk, lk = divmod(k, m)
+    def count(vs):
+        if len(vs) == 1: return [vs[0]], []
+        (al, au), (bl, bu) = count(vs[:len(vs)//2]), count(vs[len(vs)//2:])
+        lower = [enc.new_var() for i in range(m-1)]
+        upper = [enc.new_var() for i in range(min(len(au)+len(bu)+1, qk+1))]
+        carry = enc.new_var()
+        for i in range(len(al)+1):
+            for j in range(len(bl)+1):
+                if i+j == 0: continue
+                clause = []
+                if i > 0: clause.append(-al[i-1])
+                if j > 0: clause.append(-bl[j-1])
+                if i+j < m:
+                    enc.write_clause(clause + [carry, lower[i+j-1]])
+                else:
+                    enc.write_clause(clause + [carry])
+                    if i+j > m:
+                        enc.write_clause(clause + [lower[i+j-m-1]])
+        for i in range(len(au)+1):
+            for j in range(len(bu)+1):
+                clause = []
+                if i > 0: clause.append(-au[i-1])
+                if j > 0: clause.append(-bu[j-1])
+                if i+j > 0:
+                    enc.write_clause(clause + [upper[min(i+j, qk+1)-1]])
+                enc.write_clause(clause + [-carry, upper[min(i+j+1, qk+1)-1]])
+        return lower, upper
+    lower, upper = count(vs)
+    # The count is at least (qk+1)*m or at least qk*m+lk+1 are both too many.
+    if len(upper) > qk: enc.write_clause([-upper[qk]])
+    if lk+1 < m:
+        enc.write_clause(([-upper[qk-1]] if qk > 0 else []) + [-lower[lk]])
+
+cardinality_encodings = {
+    'sequential': sequential_at_most,
+    'totalizer': totalizer_at_most,
+    'modtotalizer': modulo_totalizer_at_most,
+}
+
+def word_pair(w1, w2): return (w1, w2) if w1 < w2 else (w2, w1)
+def word_pairs(ws):
+    for w1, w2 in itertools.combinations(ws, 2):
+        yield word_pair(w1, w2)
+
+# Connectivity encodings. Each one takes intersects, a map from word pairs to
+# a var that's true iff the pair intersects, and used, a map from words to a
+# var that's true iff the word is placed, and generates clauses satisfiable
+# iff every pair of used words is connected by a path of intersecting words.
+
+# Ladder: level i is true iff there's a walk of exactly i+1 intersections
+# between the pair. Needs len(words)-1 levels of O(n^3) witnesses each.
+def ladder_connectivity(enc, words, intersects, used, args):
+    # Define level-0 reachability vars (intersections)
+    reachable = [{} for i in range(len(words)-1)]
+    for wp in word_pairs(words):
+        if intersects.get(wp) is None:
+            v = enc.new_var()
+            reachable[0][wp] = v
+            enc.write_clause([-v])
+        else:
+            reachable[0][wp] = intersects[wp]
+
+    # Every level after the first allocates the same number of vars for each
+    # pair: a witness for each word the pair could reach through and one for
+    # their disjunction, or a single false var if there are none. So the
+    # vars of each level are known before it's generated.
+    sizes = {}
+    for w1, w2 in word_pairs(words):
+        k = len([w for w in words if w != w1 and w != w2 and
+                 intersects.get(word_pair(w1,w)) is not None])
+        sizes[(w1,w2)] = k + 1 if k > 0 else 1
+    nvars = sum(sizes.values())
+
+    # Define level i reachability in terms of level (i-1)
+    for i in range(1,len(reachable)):
+        v = enc.num_vars()
+        for wp in word_pairs(words):
+            v += sizes[wp]
+            reachable[i][wp] = v
+        enc.begin_family('connectivity level %d' % i)
+        enc.shard(nvars, ladder_level, words, intersects, reachable[i-1])
+    enc.begin_family('connectivity')
+
+    # w1 is reachable from w2 if it's i-reachable for some i
+    # Assert that everything is (len(words)-1) reachable from everything
+    for w1, w2 in word_pairs(words):
+        dis = [reachable[i][(w1,w2)] for i in range(len(reachable))]
+        both_used = conjunction_witness(enc, [used[w1], used[w2]])
+        enc.write_clause([-both_used, disjunction_witness(enc, dis)])
+
+def ladder_level(enc, words, intersects, prev):
+    for w1, w2 in word_pairs(words):
+        dis = []
+        for w in words:
+            if w == w1 or w == w2: continue
+            wa, wb = word_pair(w1,w), word_pair(w,w2)
+            if intersects.get(wa) is None: continue
+            conj = [intersects[wa], prev[wb]]
+            dis.append(conjunction_witness(enc, conj))
+        if len(dis) == 0:
+            v = enc.new_var()
+            enc.write_clause([-v])
+        else:
+            disjunction_witness(enc, dis)
+
+# Path doubling: level i is true iff there's a path of at most 2^i
+# intersections between the pair, so only ceil(log2(len(words)-1)) levels
+# are needed.
+def doubling_connectivity(enc, words, intersects, used, args):
+    def intersect_or_false(wp):
+        if intersects.get(wp) is None:
+            v = enc.new_var()
+            enc.write_clause([-v])
+            return v
+        return intersects[wp]
+
+    reachable = dict((wp, intersect_or_false(wp)) for wp in word_pairs(words))
+    span, level = 1, 1
+    while span < len(words) - 1:
+        # Each pair gets a witness for every other word and their disjunction.
+        nreachable, v = {}, enc.num_vars()
+        for wp in word_pairs(words):
+            v += len(words) - 1
+            nreachable[wp] = v
+        enc.begin_family('connectivity level %d' % level)
+        enc.shard(len(nreachable) * (len(words) - 1), doubling_level, words,
+                  reachable)
+        reachable = nreachable
+        span, level = span * 2, level + 1
+    enc.begin_family('connectivity')
+
+    for w1, w2 in word_pairs(words):
+        both_used = conjunction_witness(enc, [used[w1], used[w2]])
+        enc.write_clause([-both_used, reachable[(w1,w2)]])
+
+def doubling_level(enc, words, prev):
+    for w1, w2 in word_pairs(words):
+        dis = [prev[(w1,w2)]]
+        for w in words:
+            if w == w1 or w == w2: continue
+            conj = [prev[word_pair(w1,w)], prev[word_pair(w,w2)]]
+            dis.append(conjunction_witness(enc, conj))
+        disjunction_witness(enc, dis)
+
+# Spanning tree: every used word except a single root picks an intersecting,
+# used parent with a strictly smaller depth. Depths are order-encoded:
+# deeper[w][k] is true iff w has depth greater than k. Returns the vars that
+# are true iff each word is the root.
+def tree_connectivity(enc, words, intersects, used, args):
+    n = len(words)
+    if n < 2: return None
+    root = {}
+    for w in words:
+        root[w] = enc.new_var()
+        enc.write_clause([-root[w], used[w]])
+    for clause in at_most_one_true(enc, root.values(), args.amo):
+        enc.write_clause(clause)
+
+    deeper = {}
+    for w in words:
+        deeper[w] = [enc.new_var() for k in range(n-1)]
+        for k in range(1, n-1):
+            enc.write_clause([-deeper[w][k], deeper[w][k-1]])
+        enc.write_clause([-root[w], -deeper[w][0]])
+
+    for w in words:
+        parents = []
+        for u in words:
+            if u == w or intersects.get(word_pair(w,u)) is None: continue
+            p = enc.new_var()
+            parents.append(p)
+            enc.write_clause([-p, intersects[word_pair(w,u)]])
+            # depth(w) > depth(u)
+            enc.write_clause([-p, deeper[w][0]])
+            for k in range(n-2):
+                enc.write_clause([-p, -deeper[u][k], deeper[w][k+1]])
+            enc.write_clause([-p, -deeper[u][n-2]])
+        enc.write_clause([-used[w], root[w]] + parents)
+    return root
+
+# A word's placements and their vars, stored compactly so that big boards and
+# word lists fit in memory. Each placement of a word of n letters has a code:
+# the horizontal placements come first in row-major order, then the vertical
+# ones. codes holds the codes of the placements that are encoded, in order,
+# and their vars are consecutive from first, which is set once they're
+# allocated. index maps each code to its index in codes plus one, or to 0 if
+# the placement isn't encoded. Reads like a dict from (o,r,c) to vars.
+class PlacementTable(Mapping):
+    def __init__(self, word, rows, cols, codes, first=None):
+        n = len(word)
+        self.word, self.rows, self.cols, self.first = word, rows, cols, first
+        self.hcols = max(cols - n + 1, 0)
+        self.nh = rows * self.hcols
+        self.codes = array('i', codes)
+        self.index = array('i', [0]) * (self.nh + max(rows - n + 1, 0) * cols)
+        for i, code in enumerate(self.codes): self.index[code] = i + 1
+        # The cells placements start at as a bitset for each orientation, and
+        # the positions of each letter, for finding crossings.
+        self.starts = {'H': 0, 'V': 0}
+        for o, r, c in self: self.starts[o] |= 1 << (r * cols + c)
+        self.positions = defaultdict(list)
+        for i, ch in enumerate(word): self.positions[ch].append(i)
+
+    # The code of placement p, or None if it's off the board.
+    def code(self, p):
+        o, r, c = p
+        if o == 'H':
+            if 0 <= r < self.rows and 0 <= c < self.hcols:
+                return r * self.hcols + c
+        elif 0 <= r <= self.rows - len(self.word) and 0 <= c < self.cols:
+            return self.nh + r * self.cols + c
+        return None
+
+    def placement(self, code):
+        if code < self.nh: return ('H',) + divmod(code, self.hcols)
+        return ('V',) + divmod(code - self.nh, self.cols)
+
+    # The table of just the placements in ps.
+    def subset(self, ps):
+        return PlacementTable(self.word, self.rows, self.cols,
+                              [self.code(p) for p in ps], self.first)
+
+    # The var of the placement in orientation o starting at the cell with
+    # index start in row-major order, which has to be one of them.
+    def start_var(self, o, start):
+        if o == 'H':
+            r, c = divmod(start, self.cols)
+            code = r * self.hcols + c
+        else:
+            code = self.nh + start
+        return self.first + self.index[code] - 1
+
+    def get(self, p, default=None):
+        code = self.code(p)
+        i = 0 if code is None else self.index[code]
+        return self.first + i - 1 if i else default
+
+    def __getitem__(self, p):
+        v = self.get(p)
+        if v is None: raise KeyError(p)
+        return v
+
+    def __iter__(self): return map(self.placement, self.codes)
+    def __len__(self): return len(self.codes)
+
+    def items(self):
+        return ((self.placement(code), self.first + i)
+                for i, code in enumerate(self.codes))
+
+    def values(self): return range(self.first, self.first + len(self.codes))
+
+# Placements are (orientation,row,col) triples giving the origin of a word.
+# Lists every placement of each word on a rows x cols board.
+def candidate_placements(words, rows, cols):
+    placements = {}
+    for wi, word in enumerate(words):
+        nh = rows * max(cols - len(word) + 1, 0)
+        nv = max(rows - len(word) + 1, 0) * cols
+        # Symmetry-breaking: omit vertical placement of first word only.
+        if rows == cols and wi == 0: nv = 0
+        placements[word] = PlacementTable(word, rows, cols, range(nh + nv))
+    return placements
+
+# (row,col,letter) for each cell covered by word at placement p.
+def placement_cells(word, p):
+    o, r, c = p
+    if o == 'H': return [(r,c+i,ch) for i, ch in enumerate(word)]
+    return [(r+i,c,ch) for i, ch in enumerate(word)]
+
+# (row,col) for the cells just before and after word at placement p.
+def placement_stops(word, p, rows, cols):
+    o, r, c = p
+    if o == 'H': cells = [(r,c-1), (r,c+len(word))]
+    else: cells = [(r-1,c), (r+len(word),c)]
+    return [(sr,sc) for sr, sc in cells if 0 <= sr < rows and 0 <= sc < cols]
+
+def jittered(p, jitter):
+    for rj in range(-jitter,jitter+1):
+        for cj in range(-jitter,jitter+1):
+            yield (p[0], p[1]+rj, p[2]+cj)
+
+# Placement of the second word of a relative force, given the first's.
+def reloffset(x,p1,p2):
+    o, r, c = x
+    if o == 'H':
+        return ('V',r-p2,c+p1)
+    else: # o == 'V'
+        return ('H',r+p1,c-p2)
+
+# Removes placements that can't appear in any solution given the forces and
+# relative forces, so they don't need to be encoded. Words that must be
+# placed and have only one placement left fix the letters they cover and the
+# stops around them, which rules out placements of other words that disagree
+# with those letters, cover those stops, or put a stop on one of those
+# cells. Repeats until nothing changes.
+def prune_placements(words, placements, forces, relforces, args):
+    rows, cols = args.rows, args.cols
+    if args.lowerbound is None: required = set(words)
+    else: required = set(forces)
+    # Without forces, only required words with a single placement rule
+    # anything out, so there's usually nothing to do.
+    if not forces and not relforces and \
+       all(len(placements[w]) != 1 for w in required):
+        return placements
+    placements = dict((w, list(ps)) for w, ps in placements.items())
+    for word, p in forces.items():
+        window = set(jittered(p, args.jitter))
+        placements[word] = [x for x in placements[word] if x in window]
+
+    removed = defaultdict(set)
+    changed = True
+    while changed:
+        changed = False
+        def keep(word, ps):
+            nonlocal changed
+            if len(ps) == len(placements[word]): return
+            removed[word].update(set(placements[word]) - set(ps))
+            placements[word], changed = ps, True
+
+        # Letters and stops fixed by words with a single placement left.
+        letters, fixed_by, stops = {}, {}, defaultdict(set)
+        for word in required:
+            if len(placements[word]) != 1: continue
+            p = placements[word][0]
+            for r, c, ch in placement_cells(word, p):
+                letters[(r,c)], fixed_by[(r,c)] = ch, word
+            for cell in placement_stops(word, p, rows, cols):
+                stops[cell].add(word)
+        def compatible(word, p):
+            for r, c, ch in placement_cells(word, p):
+                if fixed_by.get((r,c), word) != word and letters[(r,c)] != ch:
+                    return False
+                if len(stops[(r,c)] - set([word])) > 0: return False
+            for cell in placement_stops(word, p, rows, cols):
+                if fixed_by.get(cell, word) != word: return False
+            return True
+        for word in words:
+            keep(word, [p for p in placements[word] if compatible(word, p)])
+
+        # w1 can only go where w2 can follow it. If w1 has to be placed, w2
+        # can only go where w1 puts it; otherwise it just can't go anywhere
+        # w1 would have to follow it to a removed placement.
+        for w1, p1, w2, p2 in relforces:
+            ps2 = set(placements[w2])
+            keep(w1, [x for x in placements[w1] if reloffset(x,p1,p2) in ps2])
+            if w1 in required:
+                partners = set(reloffset(x,p1,p2) for x in placements[w1])
+                keep(w2, [x for x in placements[w2] if x in partners])
+            else:
+                lost = set(reloffset(x,p1,p2) for x in removed[w1])
+                keep(w2, [x for x in placements[w2] if x not in lost])
+    return placements
+
+# Writes the clauses for each placement of word: a placement var implies the
+# letters, hvars or vvars and stops it needs. The word is placed at most
+# once, and a final var is true iff it's placed anywhere.
+def placement_block(enc, word, ps, pos, hvar, vvar, stop, args):
+    rows, cols = args.rows, args.cols
+    vs = []
+    for o, r, c in ps:
+        v = enc.new_var()
+        enc.add_comment('var {} == {} at {}({},{})'.format(v,word,o,r,c))
+        if o == 'H':
+            if c > 0:
+                enc.write_clause([-v, stop[(r,c-1)]])
+            for i, ch in enumerate(word):
+                enc.write_clause([-v, pos[(ch,r,c+i)]])
+                enc.write_clause([-v, hvar[(r,c+i)]])
+            if c+len(word) < cols:
+                enc.write_clause([-v, stop[(r,c+len(word))]])
+        else: # o == 'V'
+            if r > 0:
+                enc.write_clause([-v, stop[(r-1,c)]])
+            for i, ch in enumerate(word):
+                enc.write_clause([-v, pos[(ch,r+i,c)]])
+                enc.write_clause([-v, vvar[(r+i,c)]])
+            if r+len(word) < rows:
+                enc.write_clause([-v, stop[(r+len(word),c)]])
+        vs.append(v)
+
+    # Each word should be used at most once.
+    for clause in at_most_one_true(enc, vs, args.amo):
+        enc.write_clause(clause)
+    disjunction_witness(enc, vs)
+
+# NumPy, if it's installed and --no-numpy wasn't given, or None.
+def numpy_or_none(args):
+    if args.no_numpy: return None
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+# The letters that have pos vars, numbered, and pos, hvar, vvar and stop as
+# arrays indexed by [letter,row,col] and [row,col], for
+# placement_block_numpy.
+def cell_grids(np, pos, hvar, vvar, stop, rows, cols):
+    letters = sorted(set(ch for ch, r, c in pos))
+    letters = dict((ch, i) for i, ch in enumerate(letters))
+    grids = [np.zeros((len(letters), rows, cols), dtype=np.int64)] + \
+        [np.zeros((rows, cols), dtype=np.int64) for i in range(3)]
+    for (ch, r, c), v in pos.items(): grids[0][letters[ch], r, c] = v
+    for grid, vs in zip(grids[1:], (hvar, vvar, stop)):
+        for (r, c), v in vs.items(): grid[r, c] = v
+    return letters, grids
+
+# Formatting a few thousand placements at a time keeps the strings small.
+FORMAT_ROWS = 4096
+
+# Writes the same clauses as placement_block, in the same order, from the
+# PlacementTable ps and the cell_grids. Each placement's comment and clauses
+# are a row of a table of ints, built a column at a time, and rows that
+# need the same clauses, the ones with the same stops, are formatted
+# together with one format string.
+def placement_block_numpy(enc, word, ps, grids, args):
+    import numpy as np
+    rows, cols, n = args.rows, args.cols, len(word)
+    letters, (pos, hvar, vvar, stop) = grids
+    first = enc.num_vars() + 1
+    codes = np.asarray(ps.codes, dtype=np.int64)
+    split = int(np.searchsorted(codes, ps.nh))
+    clause = '-%d %d 0\n'
+    nclauses = 0
+    for o, vs, part in (('H', first, codes[:split]),
+                        ('V', first + split, codes[split:] - ps.nh)):
+        if len(part) == 0: continue
+        # A word without placements might have letters that no pos var has.
+        ls = [letters[ch] for ch in word]
+        v = vs + np.arange(len(part))
+        if o == 'H':
+            r, c = np.divmod(part, ps.hcols)
+            cells = [(r, c+i) for i in range(n)]
+            before, after = (r, c-1), (r, np.minimum(c+n, cols-1))
+            kind = (c > 0) + 2 * (c+n < cols)
+            lines = hvar
+        else:  # o == 'V'
+            r, c = part // cols, part % cols
+            cells = [(r+i, c) for i in range(n)]
+            before, after = (r-1, c), (np.minimum(r+n, rows-1), c)
+            kind = (r > 0) + 2 * (r+n < rows)
+            lines = vvar
+        columns = [v, r, c, v, stop[before]]
+        for i, cell in enumerate(cells):
+            columns += [v, pos[(ls[i],) + cell], v, lines[cell]]
+        columns += [v, stop[after]]
+        table = np.column_stack(columns)
+
+        head = 'c var %d == {} at {}(%d,%d)\n'.format(word.replace('%', '%%'), o)
+        body = list(range(5, 5 + 4*n))
+        starts = [0] + (np.flatnonzero(np.diff(kind)) + 1).tolist() + [len(part)]
+        for s, e in zip(starts, starts[1:]):
+            k = int(kind[s])
+            sel = [0, 1, 2] + ([3, 4] if k & 1 else []) + body + \
+                ([5 + 4*n, 6 + 4*n] if k & 2 else [])
+            fmt = head + clause * (2*n + (k & 1) + (k >> 1))
+            for i in range(s, e, FORMAT_ROWS):
+                j = min(i + FORMAT_ROWS, e)
+                values = table[i:j][:, sel].ravel().tolist()
+                enc.out.write((fmt * (j - i)) % tuple(values))
+            nclauses += (e - s) * (2*n + (k & 1) + (k >> 1))
+    enc.ensure_vars(first + len(ps) - 1)
+    enc.cc += nclauses
+    enc.lc += 2 * nclauses
+
+    vs = list(range(first, first + len(ps)))
+    if args.amo == 'pairwise' or len(vs) <= AMO_PAIRWISE_MAX:
+        # Each row of pairs is one join.
+        tails = ['-%d 0\n' % v for v in vs]
+        for i in range(len(vs) - 1):
+            prefix = '-%d ' % vs[i]
+            enc.out.write(prefix + prefix.join(tails[i+1:]))
+        m = len(vs) * (len(vs) - 1) // 2
+        enc.cc += m
+        enc.lc += 2 * m
+    else:
+        for clause in at_most_one_true(enc, vs, args.amo):
+            enc.write_clause(clause)
+    used = enc.new_var()
+    enc.write_clause(vs + [-used])
+    if vs:
+        prefix = '%d -' % used
+        enc.out.write(prefix + prefix.join('%d 0\n' % v for v in vs))
+        enc.cc += len(vs)
+        enc.lc += 2 * len(vs)
+
+# The crossings of placements of two words with tables t1 and t2. Shifting the
+# bitset of the cells where t1's horizontal placements start by the position
+# of a letter in the word gives the cells where they put that letter, and
+# the same goes for vertical placements, shifted by whole rows. So for each
+# pair of positions with the same letter, the cells both shifted bitsets
+# have are where a placement of one word crosses a placement of the other.
+# Yields each orientation of the first word, the shift for each word and
+# those cells.
+def crossing_cells(t1, t2):
+    shift = {'H': 1, 'V': t1.cols}
+    for o1, o2 in (('H', 'V'), ('V', 'H')):
+        s1, s2 = t1.starts[o1], t2.starts[o2]
+        if s1 == 0 or s2 == 0: continue
+        for j, ch in enumerate(t1.word):
+            for k in t2.positions.get(ch, ()):
+                d1, d2 = j * shift[o1], k * shift[o2]
+                cells = (s1 << d1) & (s2 << d2)
+                if cells: yield o1, d1, o2, d2, cells
+
+# A horizontal and a vertical placement cross in at most one cell, so the
+# number of crossings is the number of those cells.
+def crossing_count(t1, t2):
+    return sum(bin(cells).count('1') for o1, d1, o2, d2, cells
+               in crossing_cells(t1, t2))
+
+# The pairs of placement vars of the two words that cross, in order.
+def crossing_vars(t1, t2):
+    found = []
+    for o1, d1, o2, d2, cells in crossing_cells(t1, t2):
+        while cells:
+            low = cells & -cells
+            x = low.bit_length() - 1
+            found.append((t1.start_var(o1, x - d1), t2.start_var(o2, x - d2)))
+            cells ^= low
+    found.sort()
+    return found
+
+# Intersections are generated in shards of this many word pairs.
+PAIRS_PER_SHARD = 64
+
+# Writes a witness for each crossing of each pair of words in pairs, and
+# makes intersects[pair] true iff one of them is.
+def intersection_block(enc, pairs, placement_vars, intersects):
+    for w1, w2 in pairs:
+        dis = [conjunction_witness(enc, [v1,v2]) for v1, v2
+               in crossing_vars(placement_vars[w1], placement_vars[w2])]
+        disjunction_witness(enc, dis, intersects[(w1,w2)])
+
+# The placement vars that cover (r,c) horizontally and vertically, those
+# grouped by the letter they put there, and those that have a stop there.
+def cell_witnesses(placement_vars, r, c):
+    across, down, letters, stops = [], [], defaultdict(list), []
+    for word, t in placement_vars.items():
+        for j, ch in enumerate(word):
+            h, v = t.get(('H',r,c-j)), t.get(('V',r-j,c))
+            if h is not None: across.append(h); letters[ch].append(h)
+            if v is not None: down.append(v); letters[ch].append(v)
+        n = len(word)
+        for p in (('H',r,c+1), ('H',r,c-n), ('V',r+1,c), ('V',r-n,c)):
+            v = t.get(p)
+            if v is not None: stops.append(v)
+    return across, down, letters, stops
+
+# Maps each (row,col) to the set of letters that placements put there.
+def letter_domains(words, placements):
+    domains = defaultdict(set)
+    for word in words:
+        for p in placements[word]:
+            for r, c, ch in placement_cells(word, p):
+                domains[(r,c)].add(ch)
+    return domains
+
+# Generates the base encoding, returning the vars that generate_constraints
+# needs. Placements ruled out by forces and relforces are left out if prune
+# is true; otherwise forces and relforces are ignored here.
+def generate_word_placements(enc, words, forces, relforces, args, prune=True):
+    rows, cols = args.rows, args.cols
+    enc.begin_family('pruning')
+    placements = candidate_placements(words, rows, cols)
+    if prune:
+        pruned = prune_placements(words, placements, forces, relforces, args)
+        placements = dict((w, placements[w].subset(pruned[w])) for w in words)
+    enc.begin_family('cells')
+    alphabet = set(ch for w in words for ch in w)
+    # Only letters that some placement puts on a cell can appear there.
+    domains = letter_domains(words, placements)
+    pos = {}  # pos[(ch,row,col)] == "(row,col) is ch"
+    for row in range(rows):
+        for col in range(cols):
+            vs = []
+            for ch in alphabet:
+                if ch not in domains[(row,col)]: continue
+                v = enc.new_var()
+                vs.append(v)
+                pos[(ch,row,col)] = v
+                #enc.add_comment('var {} == ({},{}) = {}'.format(v,row,col,ch))
+            # Every (row,col) can have at most one letter assigned.
+            for clause in at_most_one_true(enc, vs, args.amo):
+                enc.write_clause(clause)
+
+    # Each (row,col) also has three vars associated with it:
+    # * hvar: true iff some word is written horizontally on that square
+    # * vvar: true iff some word is written vertically on that square
+    # * stop: true iff the square is a left/right top/bottom boundary of a word
+    enc.begin_family('adjacency')
+    hvar, vvar, stop = {}, {}, {}
+    for row in range(rows):
+        for col in range(cols):
+            hvar[(row,col)] = enc.new_var()
+            vvar[(row,col)] = enc.new_var()
+            stop[(row,col)] = enc.new_var()
+
+    # A stop and an hvar can't cooccur.
+    # A stop and a vvar can't cooccur.
+    for row in range(rows):
+        for col in range(cols):
+            enc.write_clause([-hvar[(row,col)], -stop[(row,col)]])
+            enc.write_clause([-vvar[(row,col)], -stop[(row,col)]])
+
+    # Two hvars can't be vertically adjacent (unless they're also vvars).
+    for r in range(rows-1):
+        for c in range(cols):
+            enc.write_clause([-hvar[(r,c)], -hvar[(r+1,c)], vvar[(r,c)]])
+            enc.write_clause([-hvar[(r,c)], -hvar[(r+1,c)], vvar[(r+1,c)]])
+
+    # Two vvars can't be horizontally adjacent (unless they're also hvars).
+    for r in range(rows):
+        for c in range(cols-1):
+            enc.write_clause([-vvar[(r,c)], -vvar[(r,c+1)], hvar[(r,c)]])
+            enc.write_clause([-vvar[(r,c)], -vvar[(r,c+1)], hvar[(r,c+1)]])
+
+    # Finally, use pos, hvar, vvar, and stop to express word placements. Each
+    # word's placement vars come first in its block, then the vars for its
+    # at-most-one constraint and its used var.
+    enc.begin_family('placements')
+    np = numpy_or_none(args)
+    if np is not None: grids = cell_grids(np, pos, hvar, vvar, stop, rows, cols)
+    used = {}
+    for word in words:
+        t = placements[word]
+        t.first = enc.num_vars() + 1
+        nvars = len(t) + amo_vars(len(t), args.amo) + 1
+        used[word] = t.first + nvars - 1
+        if np is None:
+            enc.shard(nvars, placement_block, word, t, pos, hvar, vvar, stop,
+                      args)
+        else:
+            enc.shard(nvars, placement_block_numpy, word, t, grids, args)
+
+    # Generate intersection vars: vars that are true iff a pair of words
+    # intersect, based on placement vars. There's a witness for each crossing
+    # of a pair's placements, followed by a var for each pair that's true iff
+    # any of its witnesses are.
+    enc.begin_family('intersections')
+    crossings = dict((wp, crossing_count(placements[wp[0]], placements[wp[1]]))
+                     for wp in word_pairs(words))
+    pairs = [wp for wp in word_pairs(words) if crossings[wp] > 0]
+    nwitnesses = sum(crossings.values())
+    intersects = {}  # maps (w1,w2) to a var that's true iff they intersect
+    for i, wp in enumerate(pairs):
+        intersects[wp] = enc.num_vars() + nwitnesses + i + 1
+    for i in range(0, len(pairs), PAIRS_PER_SHARD):
+        chunk = pairs[i:i+PAIRS_PER_SHARD]
+        chunk_words = set(w for wp in chunk for w in wp)
+        enc.shard(sum(crossings[wp] for wp in chunk),
+                  intersection_block, chunk,
+                  dict((w, placements[w]) for w in chunk_words), intersects)
+    enc.ensure_vars(enc.num_vars() + len(pairs))
+
+    connectivity = {
+        'ladder': ladder_connectivity,
+        'doubling': doubling_connectivity,
+        'tree': tree_connectivity,
+    }[args.connectivity]
+    enc.begin_family('connectivity')
+    roots = connectivity(enc, words, intersects, used, args)
+
+    # Don't let an hvar or vvar get set unless there's a placement var that
+    # can serve as a witness for it. Otherwise, the solver will choose a
+    # packing that's too tight by setting hvars/vvars where there aren't
+    # any words.
+    enc.begin_family('witnesses')
+    for r in range(rows):
+        for c in range(cols):
+            across, down, letters, stops = cell_witnesses(placements, r, c)
+            if across: enc.write_clause([-hvar[(r,c)]] + sorted(across))
+            if down: enc.write_clause([-vvar[(r,c)]] + sorted(down))
+            if not args.extra: continue
+            if stops: enc.write_clause([-stop[(r,c)]] + sorted(stops))
+            for ch in sorted(letters):
+                enc.write_clause([-pos[(ch,r,c)]] + sorted(letters[ch]))
+
+    enc.begin_family('shard output')
+    enc.join_shards()
+    return {'words': words, 'placement_vars': placements, 'used': used,
+            'hvar': hvar, 'vvar': vvar, 'roots': roots,
+            'rows': rows, 'cols': cols}
+
+# Adds the options that pick what's encoded and how to parser, for the
+# scripts that encode boards.
+def add_encoding_arguments(parser):
+    parser.add_argument('--extra',
+                        action='store_true',
+                        help='add some unnecessary clauses that may help')
+    parser.add_argument('--forcefile',
+                        help='file containing forced placements')
+    parser.add_argument('--jitter', type=int, default=0,
+                        help='jitter to apply to forced placements')
+    parser.add_argument('--relforcefile',
+                        help='file containing relative forces')
+    parser.add_argument('--lowerbound', type=int,
+                        help='at least this many words must be placed ' + \
+                        '(default: all)')
+    parser.add_argument('--empty', type=int,
+                        help='force at most this many empty cells')
+    parser.add_argument('--connectivity',
+                        choices=['ladder','doubling','tree'],
+                        default='ladder',
+                        help='encoding used to connect words (default: ladder)')
+    parser.add_argument('--amo',
+                        choices=sorted(amo_encodings.keys()),
+                        default='pairwise',
+                        help='encoding used for at-most-one constraints ' + \
+                        '(default: pairwise)')
+    parser.add_argument('--cardinality',
+                        choices=['sortnet'] + sorted(cardinality_encodings),
+                        default='sortnet',
+                        help='encoding used for --lowerbound and --empty ' + \
+                        '(default: sortnet)')
+    parser.add_argument('--symmetry', action='store_true',
+                        help='rule out puzzles that can be moved up or left')
+    parser.add_argument('--cache',
+                        help='reuse the encoding of the board, words and ' + \
+                        'encoding options from this directory, only adding ' + \
+                        'forces and bounds on top of it')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='generate the encoding in this many processes ' + \
+                        '(default: 1)')
+    parser.add_argument('--no-numpy', action='store_true',
+                        help="don't use NumPy to generate placement clauses, " + \
+                        'even if it is installed')
+
+# The forces and relative forces in the files named by args.
+def read_forces(args):
+    forces = {}
+    if args.forcefile is not None: forces = read_forcefile(args.forcefile)
+
+    relforces = []
+    if args.relforcefile is not None:
+        for line in open(args.relforcefile):
+            if line.startswith('//') or line.strip() == '': continue
+            w1, p1, w2, p2 = line.strip().split(':')
+            relforces.append((w1,int(p1),w2,int(p2)))
+
+    return forces, relforces
+
+# Maps each word in a forcefile to its (orientation, row, col) placement.
+def read_forcefile(path):
+    forces = {}
+    prog = re.compile('([HV])\\((\\d+),(\\d+)\\)')
+    for line in open(path):
+        if line.startswith('//') or line.strip() == '': continue
+        word, pos = line.strip().split(':')
+        m = prog.match(pos)
+        if m is None: raise Exception("Invalid forcefile line: " + line)
+        forces[word] = (
+            m.groups()[0], int(m.groups()[1]), int(m.groups()[2]))
+    return forces
+
+# Words only read left to right and top to bottom, so the only symmetry of a
+# board that maps puzzles to puzzles is transposing a square board, which the
+# placements of the first word already break. But any puzzle can be moved up
+# and left until it touches the top row and the left column, so requiring that
+# rules out every translated copy of a puzzle. This isn't sound with forces,
+# which pin the puzzle in place.
+def anchor_top_left(enc, hvar, vvar, args):
+    enc.write_clause([x for c in range(args.cols)
+                      for x in (hvar[(0,c)], vvar[(0,c)])])
+    enc.write_clause([x for r in range(args.rows)
+                      for x in (hvar[(r,0)], vvar[(r,0)])])
+
+# Generates the constraints from forces, relforces and bounds on top of a
+# base encoding.
+def generate_constraints(enc, base, forces, relforces, args):
+    words, used = base['words'], base['used']
+    placement_vars, hvar, vvar = \
+        base['placement_vars'], base['hvar'], base['vvar']
+
+    enc.begin_family('lowerbound')
+    if args.lowerbound is None:
+        for v in used.values(): enc.write_clause([v])
+        # Every word is used, so any of them can be the root.
+        if base['roots'] is not None:
+            enc.write_clause([base['roots'][words[0]]])
+    else:
+        at_least_n_true(enc, list(used.values()), args.lowerbound,
+                        args.cardinality)
+
+    if args.empty is not None:
+        enc.begin_family('empty')
+        empty = {}
+        for r in range(args.rows):
+            for c in range(args.cols):
+                ec = [-hvar[(r,c)], -vvar[(r,c)]]
+                empty[(r,c)] = conjunction_witness(enc, ec)
+
+        # At most args.empty positions are empty.
+        at_most_n_true(enc, list(empty.values()), args.empty, args.cardinality)
+
+    if args.symmetry:
+        enc.begin_family('symmetry')
+        anchor_top_left(enc, hvar, vvar, args)
+
+    # Handle any forces
+    enc.begin_family('forces')
+    for word, pos in forces.items():
+        clause = []
+        for npos in jittered(pos, args.jitter):
+            if placement_vars[word].get(npos) is not None:
+                clause.append(placement_vars[word][npos])
+        enc.write_clause(clause)
+
+    # Handle any relative forces
+    enc.begin_family('relforces')
+    for w1, p1, w2, p2 in relforces:
+        for x1, v1 in placement_vars[w1].items():
+            x2 = reloffset(x1,p1,p2)
+            v2 = placement_vars[w2].get(x2)
+            if v2 is not None:
+                enc.add_comment('force: {} at {} <=> {} at {}'.format(w1,x1,w2,x2))
+                enc.write_clause([-v1, v2])
+                enc.write_clause([-v2, v1])
+            else:
+                enc.add_comment('force: {} can''t be at {}'.format(w1,x1))
+                enc.write_clause([-v1])
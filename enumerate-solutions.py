@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+
+# Usage: enumerate-solutions.py <cnf-file> [-n N] [--solver SOLVER]
+#                               [--varmap FILE]
+#
+# Finds up to N distinct solutions to a CNF file generated by generate-sat.py
+# with a single incremental solver: after each solution, the clause that
+# block-solution.py would print is added and the solver is run again without
+# reloading the CNF. Each solution is printed as it's found.
+
+import argparse
+import sys
+import time
+
+from solvers import default_adapter, load_cnf, open_solver
+from varmap import read_varmap
+
+def print_solution(placements, solution, rows, cols, fmt):
+    used = sorted(placements[v] for v in solution if v in placements)
+    if fmt == 'forces':
+        for word, o, r, c in used:
+            print("%s:%s(%d,%d)" % (word, o, r, c))
+        return
+    board = [[' ' for i in range(cols)] for i in range(rows)]
+    for word, o, r, c in used:
+        for i, ch in enumerate(word):
+            if o == 'H': board[r][c+i] = ch
+            else: board[r+i][c] = ch
+    for row in board:
+        print(''.join(row))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Enumerate solutions for a wordcross')
+    parser.add_argument('cnf_filename', type=str, help='input DIMACS file')
+    parser.add_argument('rows', type=int, nargs='?',
+                        help='number of rows (default: from the CNF sidecar)')
+    parser.add_argument('cols', type=int, nargs='?',
+                        help='number of columns (default: from the CNF sidecar)')
+    parser.add_argument('-n', type=int, default=10,
+                        help='stop after this many solutions (default: 10)')
+    parser.add_argument('--solver', default=default_adapter(),
+                        help='cdcl, pysat[:name] or ipasir:<library> ' + \
+                        '(default: pysat if it is installed, else cdcl)')
+    parser.add_argument('--format', choices=['ascii','forces'],
+                        default='ascii')
+    parser.add_argument('--varmap',
+                        help='the placement var sidecar ' + \
+                        '(default: next to the CNF)')
+    args = parser.parse_args()
+
+    rows, cols, placements = read_varmap(args.cnf_filename, args.varmap)
+    if args.rows is not None: rows, cols = args.rows, args.cols
+    if rows is None or cols is None:
+        parser.error('rows and cols are required without a CNF sidecar')
+
+    solver = open_solver(args.solver)
+    start = time.time()
+    load_cnf(solver, args.cnf_filename)
+    sys.stderr.write('c loaded in %.2fs\n' % (time.time() - start))
+    found = 0
+    while found < args.n:
+        start = time.time()
+        if not solver.solve():
+            sys.stderr.write('c no more solutions after %.2fs\n' %
+                             (time.time() - start))
+            break
+        found += 1
+        solution = solver.model()
+        sys.stderr.write('c solution %d in %.2fs\n' %
+                         (found, time.time() - start))
+        if found > 1: print()
+        print_solution(placements, solution, rows, cols, args.format)
+        sys.stdout.flush()
+        solver.add_clause([-v for v in solution if v in placements])
+    solver.close()
@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+
+# Usage: grow-board.py wordfile rows cols [--start K] [--solver SOLVER]
+#
+# Grows a packing of the words in wordfile on a rows x cols board one round at
+# a time. Each round asks for at least k words with --lowerbound, with the
+# words placed in earlier rounds forced where they were (give or take
+# --jitter). A solution freezes its new words and raises k; a round that's
+# UNSAT or times out releases the newest half of the forces and tries again.
+#
+# Every round's board and forces are written to the work directory along with
+# the state of the search, so an interrupted run picks up where it left off.
+# The encoding of the board is generated once and reused by every round with
+# generate-sat.py --cache.
+
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+
+from encoder import read_forcefile
+from solvers import solver_command
+from varmap import read_varmap
+
+GENERATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'generate-sat.py')
+
+def solution_placements(cnf, output):
+    rows, cols, placements = read_varmap(cnf)
+    placed = {}
+    with open(output) as f:
+        for line in f:
+            if not line.startswith('v'): continue
+            for x in line[1:].split():
+                word, o, r, c = placements.get(int(x), (None,)*4)
+                if word is not None: placed[word] = (o, r, c)
+    return placed
+
+def write_forces(path, forces):
+    with open(path, 'w') as f:
+        for word, (o, r, c) in forces.items():
+            f.write('%s:%s(%d,%d)\n' % (word, o, r, c))
+
+def write_board(path, placed, rows, cols, note):
+    board = [[' ' for i in range(cols)] for i in range(rows)]
+    for word, (o, r, c) in placed.items():
+        for i, ch in enumerate(word):
+            if o == 'H': board[r][c+i] = ch
+            else: board[r+i][c] = ch
+    with open(path, 'w') as f:
+        f.write('// %s\n' % note)
+        for row in board: f.write(''.join(row) + '\n')
+
+# The search state: the number of words the next round needs, the forced
+# placements with the round each was frozen in, and the best packing so far.
+def initial_state(args, nwords):
+    forces = {}
+    if args.forcefile is not None: forces = read_forcefile(args.forcefile)
+    frozen = dict((word, 0) for word in forces)
+    start = args.start if args.start is not None else max(len(forces), 2)
+    return {'round': 0, 'k': min(start, nwords), 'forces': forces,
+            'frozen': frozen, 'best': {}, 'best_round': None}
+
+def load_state(path):
+    with open(path) as f:
+        state = json.load(f)
+    state['forces'] = dict((w, tuple(p)) for w, p in state['forces'].items())
+    state['best'] = dict((w, tuple(p)) for w, p in state['best'].items())
+    return state
+
+def save_state(path, state):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+# Runs one round, returning 'SAT', 'UNSAT' or 'UNKNOWN' and the placements in
+# the solution, if any.
+def run_round(state, args, base, nwords):
+    cnf, forcefile, out = base + '.cnf', base + '.forces', base + '.out'
+    write_forces(forcefile, state['forces'])
+    cmd = [sys.executable, GENERATOR, args.wordfile, str(args.rows),
+           str(args.cols), '-o', cnf, '--cache',
+           os.path.join(args.workdir, 'cache'), '--forcefile', forcefile,
+           '--jitter', str(args.jitter)] + shlex.split(args.genargs)
+    # Without --lowerbound, every word is required.
+    if state['k'] < nwords: cmd += ['--lowerbound', str(state['k'])]
+    if args.empty is not None: cmd += ['--empty', str(args.empty)]
+    subprocess.run(cmd, check=True)
+    with open(out, 'w') as f:
+        try:
+            code = subprocess.run(solver_command(args.solver, cnf), stdout=f,
+                                  timeout=args.timeout).returncode
+        except subprocess.TimeoutExpired:
+            code = None
+    if code == 10: result = 'SAT', solution_placements(cnf, out)
+    elif code == 20: result = 'UNSAT', {}
+    else: result = 'UNKNOWN', {}
+    if not args.keep:
+        for path in (cnf, cnf + '.vars.json', out): os.remove(path)
+    return result
+
+# Releases the newest half of the forces, returning False if there weren't
+# any left to release.
+def release_forces(state):
+    if not state['forces']: return False
+    words = sorted(state['forces'], key=lambda w: -state['frozen'][w])
+    for word in words[:max(1, len(words) // 2)]:
+        del state['forces'][word]
+        del state['frozen'][word]
+    return True
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Grow a packing of words round by round')
+    parser.add_argument('wordfile', type=str, help='input words, one per line')
+    parser.add_argument('rows', type=int, help='number of rows')
+    parser.add_argument('cols', type=int, help='number of columns')
+    parser.add_argument('--start', type=int,
+                        help='words to ask for in the first round ' + \
+                        '(default: the number of initial forces, at least 2)')
+    parser.add_argument('--step', type=int, default=1,
+                        help='how many more words each round asks for ' + \
+                        '(default: 1)')
+    parser.add_argument('--forcefile',
+                        help='initial forces, like pack-words.py output')
+    parser.add_argument('--jitter', type=int, default=0,
+                        help='jitter to apply to forces (default: 0)')
+    parser.add_argument('--empty', type=int,
+                        help='allow at most this many empty cells every round')
+    parser.add_argument('--solver', default='kissat -q',
+                        help='solver command line, or cdcl, pysat[:name] ' + \
+                        'or ipasir:<library> (default: kissat -q)')
+    parser.add_argument('--timeout', type=float,
+                        help='give up on a round after this many seconds')
+    parser.add_argument('--genargs', default='',
+                        help='extra arguments for generate-sat.py')
+    parser.add_argument('--workdir',
+                        help='where to keep the state, boards and cache ' + \
+                        '(default: grow-<wordfile>-<rows>x<cols>)')
+    parser.add_argument('--keep', action='store_true',
+                        help="keep every round's CNF and solver output")
+    args = parser.parse_args()
+
+    words = [w.strip() for w in open(args.wordfile) if len(w.strip()) > 0]
+    if args.workdir is None:
+        args.workdir = 'grow-%s-%dx%d' % (os.path.basename(args.wordfile),
+                                          args.rows, args.cols)
+    os.makedirs(args.workdir, exist_ok=True)
+    state_path = os.path.join(args.workdir, 'state.json')
+    if os.path.exists(state_path):
+        state = load_state(state_path)
+        print('Resuming at round %d with k=%d and %d forces' %
+              (state['round'] + 1, state['k'], len(state['forces'])))
+    else:
+        state = initial_state(args, len(words))
+
+    while len(state['best']) < len(words):
+        state['round'] += 1
+        base = os.path.join(args.workdir, 'round-%03d' % state['round'])
+        start = time.time()
+        result, placed = run_round(state, args, base, len(words))
+        print('Round %d: k=%d, %d forces: %s in %.1fs' %
+              (state['round'], state['k'], len(state['forces']), result,
+               time.time() - start))
+        sys.stdout.flush()
+        if result == 'SAT':
+            write_board(base + '.txt', placed, args.rows, args.cols,
+                        '%d words in round %d' % (len(placed), state['round']))
+            write_forces(base + '.forces', placed)
+            for word, p in placed.items():
+                if word not in state['forces']:
+                    state['frozen'][word] = state['round']
+                state['forces'][word] = p
+            if len(placed) > len(state['best']):
+                state['best'], state['best_round'] = placed, state['round']
+            state['k'] = min(len(placed) + args.step, len(words))
+        elif not release_forces(state):
+            save_state(state_path, state)
+            print('No packing of %d words found; the best has %d' %
+                  (state['k'], len(state['best'])))
+            break
+        save_state(state_path, state)
+
+    if state['best_round'] is not None:
+        print('Best packing: %d words, in %s' % (len(state['best']),
+              os.path.join(args.workdir, 'round-%03d.txt' % state['best_round'])))
@@ -0,0 +1,226 @@
+#!/usr/bin/python3
+
+# Usage: pack-words.py wordfile rows cols [--beam N] [--format FORMAT]
+#
+# Quickly packs as many words from wordfile as it can into a rows x cols board
+# with a randomized beam search, following the same rules as generate-sat.py:
+# words cross in matching letters, only touch where they cross, and are all
+# connected. The best packing found is printed as an ASCII board, as forces
+# for --forcefile, as relative forces for --relforcefile or as phase hints for
+# solvers.py --phases, so that the solver starts from a promising region.
+
+import argparse
+import itertools
+import random
+import sys
+
+from encoder import placement_cells, placement_stops
+from varmap import read_varmap
+
+# A partial packing. letters maps cells to letters, across and down are the
+# cells covered by horizontal and vertical words, and stops are the cells
+# just before and after each word, which have to stay empty.
+class Packing:
+    def __init__(self, rows, cols):
+        self.rows, self.cols = rows, cols
+        self.letters, self.stops = {}, set()
+        self.across, self.down = set(), set()
+        self.by_letter = {}  # letter -> cells covered by only one word
+        self.placed = {}  # word -> placement, in the order they were placed
+        self.score = 0
+
+    def copy(self):
+        pk = Packing(self.rows, self.cols)
+        pk.letters, pk.stops = dict(self.letters), set(self.stops)
+        pk.across, pk.down = set(self.across), set(self.down)
+        pk.by_letter = dict((ch, set(cs)) for ch, cs in self.by_letter.items())
+        pk.placed, pk.score = dict(self.placed), self.score
+        return pk
+
+    def fits(self, word, p):
+        o, r, c = p
+        if r < 0 or c < 0: return False
+        if o == 'H': return r < self.rows and c + len(word) <= self.cols
+        return c < self.cols and r + len(word) <= self.rows
+
+    # Returns the number of words word at p crosses, or None if it can't go
+    # there.
+    def crossings(self, word, p):
+        if not self.fits(word, p): return None
+        for cell in placement_stops(word, p, self.rows, self.cols):
+            if cell in self.letters: return None
+        same = self.across if p[0] == 'H' else self.down
+        n = 0
+        for r, c, ch in placement_cells(word, p):
+            have = self.letters.get((r,c))
+            if have is not None:
+                if have != ch or (r,c) in same: return None
+                n += 1
+                continue
+            if (r,c) in self.stops: return None
+            # A cell that isn't a crossing can't touch any other word.
+            if p[0] == 'H': sides = [(r-1,c), (r+1,c)]
+            else: sides = [(r,c-1), (r,c+1)]
+            if any(side in self.letters for side in sides): return None
+        if self.placed and n == 0: return None
+        return n
+
+    # Placements of word that cross a word that's already placed.
+    def candidates(self, word):
+        found = set()
+        for i, ch in enumerate(word):
+            for r, c in self.by_letter.get(ch, ()):
+                if (r,c) in self.across: found.add(('V', r-i, c))
+                else: found.add(('H', r, c-i))
+        return sorted(found)
+
+    def place(self, word, p):
+        same = self.across if p[0] == 'H' else self.down
+        for r, c, ch in placement_cells(word, p):
+            if (r,c) in self.letters: self.by_letter[ch].discard((r,c))
+            else: self.by_letter.setdefault(ch, set()).add((r,c))
+            self.letters[(r,c)] = ch
+            same.add((r,c))
+        self.stops.update(placement_stops(word, p, self.rows, self.cols))
+        self.placed[word] = p
+
+# Scores a placement. Crossings count for more than letters, since they're
+# what makes a packing dense.
+def placement_score(word, n):
+    return len(word) + 3 * n
+
+# Beam search: every round, each packing in the beam is extended with every
+# placement of every unplaced word that crosses it, and the best beam
+# extensions are kept, with some noise added to their scores so that
+# different seeds find different packings.
+def pack(words, rows, cols, beam, noise, rng):
+    longest = max(len(w) for w in words)
+    beam_packings = []
+    for word in [w for w in words if len(w) == longest]:
+        for i in range(beam):
+            o = rng.choice('HV')
+            if len(word) > (cols if o == 'H' else rows): continue
+            if o == 'H': p = (o, rng.randrange(rows),
+                              rng.randrange(cols-len(word)+1))
+            else: p = (o, rng.randrange(rows-len(word)+1), rng.randrange(cols))
+            pk = Packing(rows, cols)
+            pk.place(word, p)
+            pk.score = placement_score(word, 0)
+            beam_packings.append(pk)
+    rng.shuffle(beam_packings)
+    beam_packings = beam_packings[:beam]
+    if not beam_packings: return Packing(rows, cols)
+    best = beam_packings[0]
+    while beam_packings:
+        extensions = []
+        for i, pk in enumerate(beam_packings):
+            for word in words:
+                if word in pk.placed: continue
+                for p in pk.candidates(word):
+                    n = pk.crossings(word, p)
+                    if n is None: continue
+                    score = pk.score + placement_score(word, n) + \
+                        noise * rng.random()
+                    extensions.append((score, i, word, p))
+        extensions.sort(key=lambda x: -x[0])
+        seen, next_packings = set(), []
+        for score, i, word, p in extensions:
+            pk = beam_packings[i]
+            key = frozenset(itertools.chain(pk.placed.items(), [(word, p)]))
+            if key in seen: continue
+            seen.add(key)
+            pk = pk.copy()
+            pk.place(word, p)
+            pk.score = score
+            next_packings.append(pk)
+            if len(next_packings) == beam: break
+        beam_packings = next_packings
+        if beam_packings: best = beam_packings[0]
+    return best
+
+# generate-sat.py only places the first word horizontally on square boards,
+# so transpose packings where it's vertical.
+def normalize(placed, words, rows, cols):
+    if rows != cols or placed.get(words[0], ('H',))[0] == 'H': return placed
+    flip = {'H': 'V', 'V': 'H'}
+    return dict((w, (flip[o], c, r)) for w, (o, r, c) in placed.items())
+
+def print_board(placed, rows, cols):
+    board = [[' ' for i in range(cols)] for i in range(rows)]
+    for word, p in placed.items():
+        for r, c, ch in placement_cells(word, p):
+            board[r][c] = ch
+    for row in board:
+        print(''.join(row))
+
+# Prints relative forces in the format decode-solution.py --format relative
+# uses: each pair of crossing words with the positions of the shared letter.
+def print_relative(placed):
+    cells = dict((w, dict(((r,c), i) for i, (r, c, ch)
+                          in enumerate(placement_cells(w, p))))
+                 for w, p in placed.items())
+    for x, y in itertools.combinations(placed, 2):
+        for cell in set(cells[x]) & set(cells[y]):
+            print('{}:{}:{}:{}'.format(x, cells[x][cell], y, cells[y][cell]))
+
+# Phase hints for the placement vars of cnf: true for the packing's
+# placements and false for every other one.
+def print_phases(placed, cnf, varmap=None):
+    rows, cols, placements = read_varmap(cnf, varmap)
+    lits = [v if placed.get(w) == (o, r, c) else -v
+            for v, (w, o, r, c) in sorted(placements.items())] + [0]
+    for i in range(0, len(lits), 20):
+        print(' '.join(map(str, lits[i:i+20])))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Heuristically pack words into a rectangle')
+    parser.add_argument('wordfile', type=str, help='input words, one per line')
+    parser.add_argument('rows', type=int, help='number of rows')
+    parser.add_argument('cols', type=int, help='number of columns')
+    parser.add_argument('--beam', type=int, default=16,
+                        help='packings kept each round (default: 16)')
+    parser.add_argument('--noise', type=float, default=2.0,
+                        help='random noise added to scores (default: 2)')
+    parser.add_argument('--tries', type=int, default=1,
+                        help='searches to run, keeping the best (default: 1)')
+    parser.add_argument('--seed', type=int, help='random seed')
+    parser.add_argument('--limit', type=int,
+                        help='only print this many of the words placed ' + \
+                        'first, leaving the rest to the solver')
+    parser.add_argument('--format',
+                        choices=['ascii','forces','relative','phases'],
+                        default='ascii')
+    parser.add_argument('--cnf',
+                        help='CNF file generated for the same board, ' + \
+                        'which --format phases needs')
+    parser.add_argument('--varmap',
+                        help="the --cnf file's placement var sidecar " + \
+                        '(default: next to it)')
+    args = parser.parse_args()
+    if args.format == 'phases' and args.cnf is None:
+        parser.error('--format phases needs --cnf')
+
+    words = [w.strip() for w in open(args.wordfile) if len(w.strip()) > 0]
+    rng = random.Random(args.seed)
+    best = None
+    for i in range(args.tries):
+        pk = pack(words, args.rows, args.cols, args.beam, args.noise, rng)
+        if best is None or (len(pk.placed), pk.score) > \
+           (len(best.placed), best.score):
+            best = pk
+    placed = best.placed
+    if args.limit is not None:
+        placed = dict(list(placed.items())[:args.limit])
+    placed = normalize(placed, words, args.rows, args.cols)
+    sys.stderr.write('c placed %d of %d words\n' % (len(placed), len(words)))
+
+    if args.format == 'ascii':
+        print_board(placed, args.rows, args.cols)
+    elif args.format == 'forces':
+        for word in words:
+            if word in placed: print('%s:%s(%d,%d)' % ((word,) + placed[word]))
+    elif args.format == 'relative':
+        print_relative(placed)
+    else:  # format == 'phases'
+        print_phases(placed, args.cnf, args.varmap)
@@ -0,0 +1,122 @@
+# Reads, checks and canonicalizes solutions to generated CNFs.
+#
+# A solution is a list of (word, orientation, row, col) placements. They can
+# be read from solver output, using the placement vars from a CNF's varmap,
+# or from forces like decode-solution.py --format forces prints.
+
+import hashlib
+import re
+from collections import Counter
+
+from encoder import placement_cells, placement_stops
+
+FORCE = re.compile('(.*):([HV])\\((\\d+),(\\d+)\\)$')
+
+# Yields the solutions in f, which can hold any number of solver outputs and
+# lists of forces. A solution ends at the next 's' line, at a blank line or
+# at the end of f. placements maps placement vars to placements, as
+# read_varmap returns them.
+def read_solutions(f, placements):
+    placed, started = [], False
+    for line in f:
+        if line.startswith('s '):
+            if started: yield placed
+            placed, started = [], 'UNSAT' not in line
+        elif line.startswith('v '):
+            started = True
+            # Only true vars matter, and most vars are false.
+            for x in line[1:].split():
+                if x[0] != '-' and x != '0':
+                    p = placements.get(int(x))
+                    if p is not None: placed.append(p)
+        elif line.strip() == '':
+            if started and placed: yield placed
+            placed, started = [], False
+        elif not line.startswith('c ') and line.strip() != 'c':
+            m = FORCE.match(line.strip())
+            if m is None: raise ValueError('Bad solution line: %s' % line)
+            word, o, r, c = m.groups()
+            placed.append((word, o, int(r), int(c)))
+            started = True
+    if started: yield placed
+
+# Returns a list of the ways placed breaks the rules generate-sat.py encodes:
+# words are on the board at most once, and all of them are unless lowerbound
+# is given, words only share cells where they cross with the same letter,
+# the cells just before and after a word are empty, words running the same
+# way don't touch side by side, and all the words are connected.
+def check_solution(placed, words, rows, cols, lowerbound=None):
+    problems = []
+    counts = Counter(w for w, o, r, c in placed)
+    for word, n in sorted(counts.items()):
+        if n > 1: problems.append('%s is placed %d times' % (word, n))
+    if lowerbound is None:
+        missing = sorted(set(words) - set(counts))
+        if missing: problems.append('missing %s' % ', '.join(missing))
+    elif len(counts) < lowerbound:
+        problems.append('only %d words, not %d' % (len(counts), lowerbound))
+
+    letters, across, down = {}, {}, {}  # cell -> letter, word across, down
+    for word, o, r, c in placed:
+        if r < 0 or c < 0 or \
+           (o == 'H' and (r >= rows or c + len(word) > cols)) or \
+           (o == 'V' and (c >= cols or r + len(word) > rows)):
+            problems.append('%s at %s(%d,%d) is off the board' %
+                            (word, o, r, c))
+            continue
+        same = across if o == 'H' else down
+        for r2, c2, ch in placement_cells(word, (o, r, c)):
+            have = letters.setdefault((r2,c2), ch)
+            if have != ch:
+                problems.append('%s puts %s on (%d,%d), which has %s' %
+                                (word, ch, r2, c2, have))
+            if (r2,c2) in same:
+                problems.append('%s and %s overlap at (%d,%d)' %
+                                (same[(r2,c2)], word, r2, c2))
+            same[(r2,c2)] = word
+    for word, o, r, c in placed:
+        for cell in placement_stops(word, (o, r, c), rows, cols):
+            if cell in letters:
+                problems.append('(%d,%d) next to the end of %s is not empty' %
+                                (cell + (word,)))
+
+    # Cells covered across that are next to each other vertically have to
+    # be crossings, and the same goes for cells covered down horizontally.
+    for cells, other, (dr, dc) in ((across, down, (1, 0)),
+                                   (down, across, (0, 1))):
+        for (r, c), word in sorted(cells.items()):
+            next_cell = (r+dr, c+dc)
+            if next_cell not in cells: continue
+            if (r,c) not in other or next_cell not in other:
+                problems.append('%s and %s touch at (%d,%d) and (%d,%d)' %
+                                ((word, cells[next_cell], r, c) + next_cell))
+
+    # Words that cross are connected.
+    parent = dict((w, w) for w in counts)
+    def find(w):
+        while parent[w] != w:
+            parent[w] = parent[parent[w]]
+            w = parent[w]
+        return w
+    for cell, word in across.items():
+        if cell in down: parent[find(word)] = find(down[cell])
+    if len(set(find(w) for w in counts)) > 1:
+        problems.append('the words are not all connected')
+    return problems
+
+# The same puzzle can be moved around the board or transposed, and that's
+# all, since words only read left to right and top to bottom. The canonical
+# form of a solution is the smaller of its placements, sorted, and its
+# transposed placements, sorted, both moved to the top left.
+def canonical(placed):
+    if not placed: return ()
+    rmin = min(r for w, o, r, c in placed)
+    cmin = min(c for w, o, r, c in placed)
+    flip = {'H': 'V', 'V': 'H'}
+    return min(tuple(sorted((w, o, r-rmin, c-cmin) for w, o, r, c in placed)),
+               tuple(sorted((w, flip[o], c-cmin, r-rmin)
+                            for w, o, r, c in placed)))
+
+def canonical_hash(placed):
+    key = ';'.join('%s:%s(%d,%d)' % p for p in canonical(placed))
+    return hashlib.sha256(key.encode()).hexdigest()
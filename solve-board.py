@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+
+# Usage: solve-board.py wordfile rows cols [--solver SOLVER] [--relaxed]
+#
+# Encodes a board like generate-sat.py and solves it in one go, without
+# writing the CNF or the solver's output to disk: the clauses are piped into
+# the solver's stdin as they're generated, and the solver's output is read as
+# it arrives and decoded with the placement vars that are still in memory.
+#
+# A pipe can't be rewound to fill in the header at the end, so its counts
+# have to be known before the first clause. With --cache, they come from the
+# cached base, and only the constraints on top of it are generated before the
+# solver gets anything. Otherwise the encoding is generated twice, the first
+# time just to count, unless --relaxed says the solver can do without the
+# counts, like kissat --relaxed or cadical -f can; then the header is
+# 'p cnf 0 0'.
+#
+# The exit code is the solver's: 10 if there's a solution and 20 if not.
+
+import argparse
+import io
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from encoder import (DimacsWriter, Encoder, add_encoding_arguments,
+                     load_cached_base, placement_cells, read_forces)
+from solvers import solver_command
+
+# Reads the solver's output from f as it arrives, keeping the status and the
+# vars that are true in result.
+def read_output(f, result):
+    for line in f:
+        if line.startswith(b's '):
+            result['status'] = line[2:].decode().strip()
+        elif line.startswith(b'v '):
+            result['true'].extend(int(x) for x in line[2:].split()
+                                  if x[:1] != b'-' and x != b'0')
+
+# Writes the encoding to the pipe f, returning the Encoder.
+def stream_encoding(f, words, forces, relforces, args, pool):
+    if args.cache is not None:
+        constraints = io.StringIO()
+        enc = Encoder(constraints, pool=pool)
+        base = load_cached_base(enc, args.cache, words, args)
+        enc.encode_constraints(forces, relforces, args)
+        out = DimacsWriter(raw=f, counts=(enc.num_vars(), enc.num_clauses()))
+        out.copy_from(base)
+        out.write(constraints.getvalue())
+    else:
+        counts = (0, 0)
+        if not args.relaxed:
+            with open(os.devnull, 'w') as devnull:
+                dry = Encoder(devnull, pool=pool)
+                dry.encode(words, forces, relforces, args)
+                counts = (dry.num_vars(), dry.num_clauses())
+        out = DimacsWriter(raw=f, counts=counts)
+        enc = Encoder(out, pool=pool)
+        enc.encode(words, forces, relforces, args)
+    out.close(enc.num_vars(), enc.num_clauses())
+    return enc
+
+def print_board(placed, rows, cols):
+    board = [[' ' for i in range(cols)] for i in range(rows)]
+    for word, o, r, c in placed:
+        for r2, c2, ch in placement_cells(word, (o, r, c)):
+            board[r2][c2] = ch
+    for row in board:
+        print(''.join(row))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Encode and solve a wordcross problem without files')
+    parser.add_argument('wordfile', type=str, help='input words, one per line')
+    parser.add_argument('rows', type=int, help='number of rows')
+    parser.add_argument('cols', type=int, help='number of columns')
+    add_encoding_arguments(parser)
+    parser.add_argument('--solver', default='kissat -q',
+                        help='solver command line, or cdcl, pysat[:name] ' + \
+                        'or ipasir:<library> (default: kissat -q)')
+    parser.add_argument('--relaxed', action='store_true',
+                        help="the solver doesn't need the header's counts, " + \
+                        "so don't generate the encoding twice to get them")
+    parser.add_argument('--format', choices=['ascii','forces'],
+                        default='ascii')
+    args = parser.parse_args()
+
+    words = [w.strip() for w in open(args.wordfile) if len(w.strip()) > 0]
+    forces, relforces = read_forces(args)
+    if args.symmetry and (forces or relforces):
+        parser.error("--symmetry can't be used with forces")
+
+    start = time.time()
+    solver = subprocess.Popen(solver_command(args.solver),
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    result = {'status': None, 'true': []}
+    reader = threading.Thread(target=read_output, args=(solver.stdout, result))
+    reader.start()
+    pool = ProcessPoolExecutor(args.jobs) if args.jobs > 1 else None
+    enc = None
+    try:
+        enc = stream_encoding(solver.stdin, words, forces, relforces, args,
+                              pool)
+        solver.stdin.close()
+    except BrokenPipeError:
+        pass  # the solver quit early; its exit code says why
+    finally:
+        if pool is not None: pool.shutdown()
+    sys.stderr.write('c generated in %.2fs\n' % (time.time() - start))
+    code = solver.wait()
+    reader.join()
+    sys.stderr.write('c %s in %.2fs\n' %
+                     (result['status'] or 'solver exited with %d' % code,
+                      time.time() - start))
+
+    if code == 10 and enc is not None:
+        placements = dict((v, (w,) + p)
+                          for w, t in enc.base['placement_vars'].items()
+                          for p, v in t.items())
+        placed = sorted(placements[v] for v in result['true']
+                        if v in placements)
+        if args.format == 'ascii':
+            print_board(placed, args.rows, args.cols)
+        else:
+            for p in placed: print('%s:%s(%d,%d)' % p)
+    sys.exit(code)
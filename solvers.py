@@ -0,0 +1,414 @@
+#!/usr/bin/python3
+
+# Incremental SAT solver adapters.
+#
+# Every adapter has the same interface: add_clause() adds a clause, solve()
+# returns True if the clauses added so far are satisfiable and False if not,
+# and model() returns the set of vars that are true in the last satisfying
+# assignment. Clauses can be added between calls to solve(), which keeps
+# whatever the solver learned from earlier calls. set_phases() takes a list of
+# literals that the solver should try first when deciding on their vars, if
+# it supports that.
+#
+# Adapters are named by strings like those accepted by open_solver():
+#   * cdcl: a small pure-Python CDCL solver, always available
+#   * pysat or pysat:<name>: a solver from the python-sat package
+#   * ipasir:<path>: a native solver library exposing the IPASIR interface,
+#     like the libcadical.so built by CaDiCaL
+#
+# Run as a script, solves a CNF file with one of the adapters and prints the
+# result the way standalone solvers do:
+#
+# Usage: solvers.py <solver> <cnf-file> [--phases FILE]
+
+import argparse
+import ctypes
+import heapq
+import importlib.util
+import os
+import shlex
+import sys
+
+from varmap import open_cnf
+
+ADAPTERS = ('cdcl', 'pysat', 'ipasir')
+
+# The adapter to use when none is named: pysat if it's installed, since the
+# pure-Python CDCL solver is only meant for small boards, and cdcl otherwise.
+def default_adapter():
+    return 'pysat' if importlib.util.find_spec('pysat') else 'cdcl'
+
+# Returns a solver for the adapter named by spec.
+def open_solver(spec):
+    name, _, arg = spec.partition(':')
+    if name == 'cdcl': return CDCLSolver()
+    if name == 'pysat': return PySATSolver(arg or 'cadical153')
+    if name == 'ipasir':
+        if not arg: raise ValueError('ipasir needs a library path')
+        return IpasirSolver(arg)
+    raise ValueError('Unknown solver: %s' % spec)
+
+# Returns a command line that solves cnf_filename with the solver named by
+# spec, printing the solution in the usual DIMACS output format and exiting
+# with 10 if it's satisfiable or 20 if not. Adapters are run through this
+# module; anything else is the command line of a standalone solver, like
+# 'kissat -q'. Without cnf_filename, the CNF is read from stdin.
+def solver_command(spec, cnf_filename=None):
+    if spec.partition(':')[0] in ADAPTERS:
+        return [sys.executable, os.path.abspath(__file__), spec,
+                cnf_filename or '-']
+    return shlex.split(spec) + ([cnf_filename] if cnf_filename else [])
+
+# Adds every clause in a DIMACS CNF file to solver.
+def load_cnf(solver, filename):
+    with open_cnf(filename) as f:
+        clause = []
+        for line in f:
+            if line[:1] in ('c', 'p', '%') or line.strip() == '': continue
+            for x in line.split():
+                lit = int(x)
+                if lit == 0:
+                    solver.add_clause(clause)
+                    clause = []
+                else:
+                    clause.append(lit)
+        if clause: solver.add_clause(clause)
+
+# Luby restart sequence: 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, ...
+def luby(i):
+    k = 1
+    while (1 << k) - 1 < i: k += 1
+    while i != (1 << k) - 1:
+        i -= (1 << (k-1)) - 1
+        k = 1
+        while (1 << k) - 1 < i: k += 1
+    return 1 << (k-1)
+
+# Conflict-driven clause learning with two watched literals, first-UIP
+# learning, VSIDS decisions, phase saving and Luby restarts. Literals are
+# stored as 2*var for var and 2*var+1 for -var, so lit^1 is the negation.
+class CDCLSolver:
+    RESTART_BASE = 100
+    VAR_DECAY = 0.95
+    MAX_LEARNED = 2000
+
+    def __init__(self):
+        self.nvars = 0
+        self.clauses = []
+        self.watches = [[], []]
+        self.value = [0, 0]  # indexed by literal: 1 true, -1 false, 0 unset
+        self.level = [0]
+        self.reason = [None]
+        self.activity = [0.0]
+        self.phase = [False]
+        self.heap = []
+        self.trail, self.trail_lim, self.qhead = [], [], 0
+        self.var_inc = 1.0
+        self.unsat = False
+        self.true_vars = set()
+        self.learned = {}  # learned clause index -> LBD
+        self.max_learned = self.MAX_LEARNED
+
+    def ensure_var(self, v):
+        while self.nvars < v:
+            self.nvars += 1
+            self.watches += [[], []]
+            self.value += [0, 0]
+            self.level.append(0)
+            self.reason.append(None)
+            self.activity.append(0.0)
+            self.phase.append(False)
+            heapq.heappush(self.heap, (0.0, self.nvars))
+
+    def add_clause(self, clause):
+        if self.unsat: return
+        self.backtrack(0)
+        lits = set()
+        for x in clause:
+            self.ensure_var(abs(x))
+            lit = 2*x if x > 0 else -2*x+1
+            if lit^1 in lits or self.value[lit] == 1: return
+            if self.value[lit] == 0: lits.add(lit)
+        lits = list(lits)
+        if len(lits) == 0:
+            self.unsat = True
+        elif len(lits) == 1:
+            self.enqueue(lits[0], None)
+            if self.propagate() is not None: self.unsat = True
+        else:
+            self.attach(lits)
+
+    def attach(self, lits):
+        ci = len(self.clauses)
+        self.clauses.append(lits)
+        self.watches[lits[0]^1].append(ci)
+        self.watches[lits[1]^1].append(ci)
+        return ci
+
+    def enqueue(self, lit, reason):
+        self.value[lit], self.value[lit^1] = 1, -1
+        v = lit >> 1
+        self.level[v] = len(self.trail_lim)
+        self.reason[v] = reason
+        self.trail.append(lit)
+
+    # Returns the index of a conflicting clause, or None.
+    def propagate(self):
+        value, clauses, watches = self.value, self.clauses, self.watches
+        while self.qhead < len(self.trail):
+            false_lit = self.trail[self.qhead] ^ 1
+            self.qhead += 1
+            ws = watches[false_lit^1]
+            i = j = 0
+            while i < len(ws):
+                ci = ws[i]
+                i += 1
+                c = clauses[ci]
+                if c is None: continue  # deleted by reduce()
+                if c[0] == false_lit: c[0], c[1] = c[1], c[0]
+                if value[c[0]] == 1:
+                    ws[j] = ci
+                    j += 1
+                    continue
+                for k in range(2, len(c)):
+                    if value[c[k]] != -1:
+                        c[1], c[k] = c[k], c[1]
+                        watches[c[1]^1].append(ci)
+                        break
+                else:
+                    ws[j] = ci
+                    j += 1
+                    if value[c[0]] == -1:
+                        while i < len(ws):
+                            ws[j] = ws[i]
+                            i, j = i+1, j+1
+                        del ws[j:]
+                        return ci
+                    self.enqueue(c[0], ci)
+            del ws[j:]
+        return None
+
+    def backtrack(self, level):
+        if len(self.trail_lim) <= level: return
+        for lit in self.trail[self.trail_lim[level]:]:
+            v = lit >> 1
+            self.value[lit] = self.value[lit^1] = 0
+            self.reason[v] = None
+            self.phase[v] = (lit & 1) == 0
+            heapq.heappush(self.heap, (-self.activity[v], v))
+        del self.trail[self.trail_lim[level]:]
+        del self.trail_lim[level:]
+        self.qhead = len(self.trail)
+
+    def bump(self, v):
+        self.activity[v] += self.var_inc
+        if self.activity[v] > 1e100:
+            self.activity = [a * 1e-100 for a in self.activity]
+            self.var_inc *= 1e-100
+            self.heap = [(-self.activity[u], u)
+                         for u in range(1, self.nvars+1)
+                         if self.value[2*u] == 0]
+            heapq.heapify(self.heap)
+        elif self.value[2*v] == 0:
+            heapq.heappush(self.heap, (-self.activity[v], v))
+
+    # First-UIP conflict analysis. Returns the learned clause, with the
+    # asserting literal first, and the level to backtrack to.
+    def analyze(self, ci):
+        seen = set()
+        learned = [None]
+        pending = 0
+        lit = None
+        index = len(self.trail) - 1
+        current = len(self.trail_lim)
+        while True:
+            for q in self.clauses[ci]:
+                if q == lit: continue
+                v = q >> 1
+                if v in seen or self.level[v] == 0: continue
+                seen.add(v)
+                self.bump(v)
+                if self.level[v] == current: pending += 1
+                else: learned.append(q)
+            while (self.trail[index] >> 1) not in seen: index -= 1
+            lit = self.trail[index]
+            index -= 1
+            pending -= 1
+            if pending == 0: break
+            ci = self.reason[lit >> 1]
+        learned[0] = lit ^ 1
+        self.var_inc /= self.VAR_DECAY
+
+        # Drop literals implied by the rest of the clause.
+        marked = set(q >> 1 for q in learned)
+        def redundant(q):
+            r = self.reason[q >> 1]
+            if r is None: return False
+            return all(p >> 1 in marked or self.level[p >> 1] == 0
+                       for p in self.clauses[r] if p != q ^ 1)
+        learned = learned[:1] + [q for q in learned[1:] if not redundant(q)]
+
+        if len(learned) == 1: return learned, 0
+        top = max(range(1, len(learned)),
+                  key=lambda k: self.level[learned[k] >> 1])
+        learned[1], learned[top] = learned[top], learned[1]
+        return learned, self.level[learned[1] >> 1]
+
+    # Deletes the half of the learned clauses with the most distinct decision
+    # levels, except for those that are currently reasons for assignments.
+    def reduce(self):
+        locked = set(self.reason[lit >> 1] for lit in self.trail)
+        ranked = sorted(self.learned, key=lambda ci: self.learned[ci])
+        for ci in ranked[len(ranked)//2:]:
+            if ci in locked or self.learned[ci] <= 2: continue
+            self.clauses[ci] = None
+            del self.learned[ci]
+        self.max_learned = int(self.max_learned * 1.1)
+
+    def decide(self):
+        while self.heap:
+            act, v = heapq.heappop(self.heap)
+            if self.value[2*v] != 0 or -act != self.activity[v]: continue
+            return 2*v if self.phase[v] else 2*v+1
+        for v in range(1, self.nvars+1):
+            if self.value[2*v] == 0: return 2*v if self.phase[v] else 2*v+1
+        return None
+
+    def solve(self):
+        self.true_vars = set()
+        if self.unsat: return False
+        self.backtrack(0)
+        if self.propagate() is not None:
+            self.unsat = True
+            return False
+        restarts, conflicts = 0, 0
+        limit = self.RESTART_BASE * luby(1)
+        while True:
+            ci = self.propagate()
+            if ci is not None:
+                if len(self.trail_lim) == 0:
+                    self.unsat = True
+                    return False
+                conflicts += 1
+                learned, level = self.analyze(ci)
+                self.backtrack(level)
+                if len(learned) == 1:
+                    self.enqueue(learned[0], None)
+                else:
+                    lbd = len(set(self.level[q >> 1] for q in learned))
+                    ci = self.attach(learned)
+                    self.learned[ci] = lbd
+                    self.enqueue(learned[0], ci)
+                if len(self.learned) > self.max_learned: self.reduce()
+                continue
+            if conflicts >= limit:
+                restarts, conflicts = restarts + 1, 0
+                limit = self.RESTART_BASE * luby(restarts + 1)
+                self.backtrack(0)
+                continue
+            lit = self.decide()
+            if lit is None:
+                self.true_vars = set(v for v in range(1, self.nvars+1)
+                                     if self.value[2*v] == 1)
+                return True
+            self.trail_lim.append(len(self.trail))
+            self.enqueue(lit, None)
+
+    def model(self):
+        return self.true_vars
+
+    def set_phases(self, lits):
+        for x in lits:
+            self.ensure_var(abs(x))
+            self.phase[abs(x)] = x > 0
+
+    def close(self):
+        pass
+
+# Any solver from the python-sat package, which is an optional dependency.
+class PySATSolver:
+    def __init__(self, name):
+        from pysat.solvers import Solver
+        self.solver = Solver(name=name)
+        self.true_vars = set()
+
+    def add_clause(self, clause):
+        self.solver.add_clause(clause)
+
+    def solve(self):
+        sat = self.solver.solve()
+        self.true_vars = set(x for x in self.solver.get_model() if x > 0) \
+            if sat else set()
+        return sat
+
+    def model(self):
+        return self.true_vars
+
+    def set_phases(self, lits):
+        self.solver.set_phases(lits)
+
+    def close(self):
+        self.solver.delete()
+
+# A native solver library implementing IPASIR, the standard incremental SAT
+# solver interface.
+class IpasirSolver:
+    def __init__(self, path):
+        self.lib = ctypes.CDLL(path)
+        self.lib.ipasir_init.restype = ctypes.c_void_p
+        self.lib.ipasir_add.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        self.lib.ipasir_solve.argtypes = [ctypes.c_void_p]
+        self.lib.ipasir_val.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        self.lib.ipasir_release.argtypes = [ctypes.c_void_p]
+        self.solver = self.lib.ipasir_init()
+        self.nvars = 0
+        self.true_vars = set()
+
+    def add_clause(self, clause):
+        for x in clause:
+            self.nvars = max(self.nvars, abs(x))
+            self.lib.ipasir_add(self.solver, x)
+        self.lib.ipasir_add(self.solver, 0)
+
+    def solve(self):
+        sat = self.lib.ipasir_solve(self.solver) == 10
+        self.true_vars = set(v for v in range(1, self.nvars+1)
+                             if sat and self.lib.ipasir_val(self.solver, v) > 0)
+        return sat
+
+    def model(self):
+        return self.true_vars
+
+    # IPASIR has no way to set phases.
+    def set_phases(self, lits):
+        pass
+
+    def close(self):
+        self.lib.ipasir_release(self.solver)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Solve a DIMACS CNF file with an incremental solver')
+    parser.add_argument('solver', help='cdcl, pysat[:name] or ipasir:<library>')
+    parser.add_argument('cnf_filename', type=str,
+                        help='input DIMACS file, or - for stdin')
+    parser.add_argument('--phases',
+                        help='file of literals to try first, like the ' + \
+                        'output of pack-words.py --format phases')
+    args = parser.parse_args()
+
+    solver = open_solver(args.solver)
+    load_cnf(solver, args.cnf_filename)
+    if args.phases is not None:
+        with open(args.phases) as f:
+            solver.set_phases([int(x) for x in f.read().split() if x != '0'])
+    if not solver.solve():
+        print('s UNSATISFIABLE')
+        sys.exit(20)
+    print('s SATISFIABLE')
+    model = solver.model()
+    nvars = max(model) if model else 0
+    lits = [str(v if v in model else -v) for v in range(1, nvars+1)] + ['0']
+    for i in range(0, len(lits), 10):
+        print('v ' + ' '.join(lits[i:i+10]))
+    sys.exit(10)
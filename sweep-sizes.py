@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+
+# Usage: sweep-sizes.py wordfile min max [--rectangles] [--solver SOLVER]
+#
+# Finds the smallest boards that can hold all words in wordfile by generating
+# and solving every board size from min x min to max x max in parallel. A
+# solution for one board also fits any board at least as large in both
+# dimensions, and a board that's too small makes every board it fits in too
+# small, so each result cancels the jobs it makes redundant.
+
+import argparse
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from solvers import solver_command
+
+GENERATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'generate-sat.py')
+
+# True iff a rows1 x cols1 board fits in a rows2 x cols2 board, possibly
+# after transposing it.
+def fits(size1, size2):
+    (r1, c1), (r2, c2) = size1, size2
+    return (r1 <= r2 and c1 <= c2) or (r1 <= c2 and c1 <= r2)
+
+def board_sizes(lo, hi, rectangles):
+    if not rectangles: return [(n, n) for n in range(lo, hi+1)]
+    sizes = [(r, c) for r in range(lo, hi+1) for c in range(r, hi+1)]
+    return sorted(sizes, key=lambda s: (s[0]*s[1], s))
+
+def size_name(size): return '%dx%d' % size
+
+# A generate-then-solve job for one board size, run as a pair of child
+# processes so that it can be killed at any point.
+class Job:
+    def __init__(self, size, args):
+        self.size, self.args = size, args
+        base = os.path.join(args.workdir, size_name(size))
+        self.cnf, self.out = base + '.cnf', base + '.out'
+        self.proc, self.stage = None, None
+
+    def start(self):
+        rows, cols = self.size
+        cmd = [sys.executable, GENERATOR, self.args.wordfile, str(rows),
+               str(cols), '-o', self.cnf] + shlex.split(self.args.genargs)
+        self.proc, self.stage = subprocess.Popen(cmd), 'generating'
+        self.started = time.time()
+
+    # Returns 'SAT', 'UNSAT' or None if the job is still running.
+    def poll(self):
+        code = self.proc.poll()
+        if code is None: return None
+        if self.stage == 'generating':
+            if code != 0: raise RuntimeError('Generating %s failed' % self)
+            with open(self.out, 'w') as out:
+                cmd = solver_command(self.args.solver, self.cnf)
+                self.proc = subprocess.Popen(cmd, stdout=out)
+            self.stage = 'solving'
+            return None
+        if code == 10: return 'SAT'
+        if code == 20: return 'UNSAT'
+        raise RuntimeError('Solver failed on %s with exit code %d' %
+                           (self, code))
+
+    # The generator is asked to stop first, so that it can remove its shard
+    # files, and killed if it doesn't. The solver is just killed.
+    def kill(self):
+        if self.stage == 'generating':
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                pass
+        self.proc.kill()
+        self.proc.wait()
+
+    def __str__(self): return size_name(self.size)
+
+def report(size, result, note=''):
+    print('{:<8}{:<8}{}'.format(size_name(size), result, note))
+    sys.stdout.flush()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Find the smallest boards holding a list of words')
+    parser.add_argument('wordfile', type=str, help='input words, one per line')
+    parser.add_argument('min', type=int, help='smallest side length to try')
+    parser.add_argument('max', type=int, help='largest side length to try')
+    parser.add_argument('--rectangles', action='store_true',
+                        help='try every rows x cols board, not just squares')
+    parser.add_argument('--solver', default='kissat -q',
+                        help='solver command line, or cdcl, pysat[:name] ' + \
+                        'or ipasir:<library> (default: kissat -q)')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(),
+                        help='number of boards to work on at once ' + \
+                        '(default: number of cores)')
+    parser.add_argument('--genargs', default='',
+                        help='extra arguments for generate-sat.py')
+    parser.add_argument('--workdir',
+                        help='keep CNFs and solver outputs here ' + \
+                        '(default: a temporary directory)')
+    args = parser.parse_args()
+
+    keep = args.workdir is not None
+    if keep: os.makedirs(args.workdir, exist_ok=True)
+    else: args.workdir = tempfile.mkdtemp(prefix='sweep-')
+
+    results = {}
+    pending = board_sizes(args.min, args.max, args.rectangles)
+    running = []
+    try:
+        while pending or running:
+            while pending and len(running) < args.jobs:
+                job = Job(pending.pop(0), args)
+                job.start()
+                running.append(job)
+            time.sleep(0.05)
+            for job in list(running):
+                if job not in running: continue  # cancelled below
+                result = job.poll()
+                if result is None: continue
+                running.remove(job)
+                results[job.size] = result
+                report(job.size, result,
+                       '{:.1f}s'.format(time.time() - job.started))
+                # Cancel everything this result settles.
+                if result == 'SAT': settled = lambda s: fits(job.size, s)
+                else: settled = lambda s: fits(s, job.size)
+                for other in list(running):
+                    if not settled(other.size): continue
+                    other.kill()
+                    running.remove(other)
+                    results[other.size] = result
+                    report(other.size, result, 'implied by ' + str(job))
+                for size in [s for s in pending if settled(s)]:
+                    pending.remove(size)
+                    results[size] = result
+                    report(size, result, 'implied by ' + str(job))
+    finally:
+        for job in running: job.kill()
+        if not keep: shutil.rmtree(args.workdir)
+
+    # The tight bound: the smallest boards that work, and whether every
+    # smaller board in the sweep that fits in them is too small.
+    sat = [s for s, r in results.items() if r == 'SAT']
+    minimal = [s for s in sat if not any(t != s and fits(t, s) for t in sat)]
+    if not minimal:
+        print('No board up to %dx%d works' % (args.max, args.max))
+    for size in sorted(minimal, key=lambda s: (s[0]*s[1], s)):
+        smaller = [s for s in results if s != size and fits(s, size)]
+        largest = [s for s in smaller
+                   if not any(t != s and fits(s, t) for t in smaller)]
+        if smaller and all(results[s] == 'UNSAT' for s in smaller):
+            print('Smallest: %s (tight: %s UNSAT)' %
+                  (size_name(size), ', '.join(map(size_name, largest))))
+        else:
+            print('Smallest: %s' % size_name(size))
@@ -0,0 +1,113 @@
+# Maps placement vars in a generated CNF back to word placements.
+#
+# generate-sat.py writes a sidecar file next to the CNF that lists the board
+# dimensions and, for each word, its placements in var order. Reading that is
+# much faster than scanning the CNF for 'c var ...' comments, which is still
+# done for CNF files that don't have a sidecar. The sidecar also records the
+# CNF's header, so that one left behind by an earlier CNF isn't used for a
+# new one.
+
+import gzip
+import json
+import lzma
+import os
+import re
+import sys
+
+# Opens a CNF file for reading, decompressing it if it ends in .gz or .xz.
+# '-' is stdin.
+def open_cnf(filename):
+    if filename == '-': return sys.stdin
+    if filename.endswith('.gz'): return gzip.open(filename, 'rt')
+    if filename.endswith('.xz'): return lzma.open(filename, 'rt')
+    return open(filename)
+
+# The sidecar for foo.cnf, foo.cnf.gz and foo.cnf.xz is foo.cnf.vars.json.
+def varmap_path(cnf_filename):
+    base, ext = os.path.splitext(cnf_filename)
+    if ext in ('.gz', '.xz'): cnf_filename = base
+    return cnf_filename + '.vars.json'
+
+# placement_vars maps each word to a dict from placements (orientation, row,
+# col) to vars. Each word's placement vars must be consecutive. Words without
+# placements are listed too, so that the sidecar has every word. nvars and
+# nclauses are the counts in the CNF's header.
+def write_varmap(path, rows, cols, placement_vars, nvars, nclauses):
+    words = []
+    for word, pvs in placement_vars.items():
+        if len(pvs) == 0:
+            words.append([word, None, []])
+            continue
+        first = min(pvs.values())
+        ps = sorted(pvs.items(), key=lambda x: x[1])
+        if ps[-1][1] - first != len(ps) - 1:
+            raise ValueError('Placement vars for %s are not consecutive' % word)
+        words.append([word, first, [[o, r, c] for (o, r, c), v in ps]])
+    with open(path, 'w') as f:
+        json.dump({'rows': rows, 'cols': cols, 'nvars': nvars,
+                   'nclauses': nclauses, 'words': words}, f,
+                  separators=(',', ':'))
+
+# The counts of vars and clauses in the header of a CNF file.
+def cnf_header(cnf_filename):
+    with open_cnf(cnf_filename) as f:
+        for line in f:
+            if line.startswith('p cnf'):
+                nv, nc = line.split()[2:4]
+                return int(nv), int(nc)
+            if not line.startswith('c'): break
+    raise ValueError('No header in %s' % cnf_filename)
+
+# Returns the sidecar of a CNF file, read from path, or from next to the CNF
+# if path is None, or None if there's no sidecar there. A sidecar whose header
+# doesn't match the CNF's is an error if it's given by path, and otherwise
+# ignored with a warning.
+def read_sidecar(cnf_filename, path=None):
+    default = path is None
+    if default: path = varmap_path(cnf_filename)
+    if default and not os.path.exists(path): return None
+    with open(path) as f:
+        vm = json.load(f)
+    if 'nvars' in vm and cnf_filename != '-':
+        header = cnf_header(cnf_filename)
+        if header != (vm['nvars'], vm['nclauses']):
+            note = '%s is for a CNF with %d vars and %d clauses, not %s ' \
+                'with %d and %d' % ((path, vm['nvars'], vm['nclauses'],
+                                     cnf_filename) + header)
+            if not default: raise ValueError(note)
+            sys.stderr.write('c warning: %s; reading its comments instead\n' %
+                             note)
+            return None
+    return vm
+
+# Maps each placement var in a sidecar to a (word, orientation, row, col)
+# tuple.
+def sidecar_placements(vm):
+    placements = {}
+    for word, first, ps in vm['words']:
+        for i, (o, r, c) in enumerate(ps):
+            placements[first + i] = (word, o, r, c)
+    return placements
+
+# Returns (rows, cols, placements), where placements maps each placement var
+# to a (word, orientation, row, col) tuple, from the sidecar that
+# read_sidecar finds. Without one, placements come from the CNF's comments
+# and rows and cols are None.
+def read_varmap(cnf_filename, path=None):
+    vm = read_sidecar(cnf_filename, path)
+    if vm is None: return None, None, read_comments(cnf_filename)
+    return vm['rows'], vm['cols'], sidecar_placements(vm)
+
+def read_comments(cnf_filename):
+    # comments look like 'c var 1153 == ZERO at H(0,0)'
+    prog = re.compile('c var (\\d+) == ([\\w\\s]+) at ([HV])\\((\\d+),(\\d+)\\)')
+    placements = {}
+    with open_cnf(cnf_filename) as f:
+        for line in f:
+            # Comments can appear anywhere, so read to the end of the file.
+            if not line.startswith('c'): continue
+            m = prog.match(line)
+            if m is None: continue
+            v, word, o, r, c = m.groups()
+            placements[int(v)] = (word, o, int(r), int(c))
+    return placements
@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+
+# Usage: verify-solutions.py <cnf-file> [outputs...] [--dedup] [--format FORMAT]
+#                             [--varmap FILE]
+#
+# Checks solutions to a CNF file generated by generate-sat.py against the
+# rules of the puzzle instead of trusting the solver, and finds the ones that
+# are the same puzzle moved around the board or transposed. Each output can
+# hold any number of solver outputs or lists of forces, like
+# enumerate-solutions.py --format forces prints, so thousands of solutions
+# can be streamed through at once. Reads stdin if no outputs are given.
+#
+# The exit code is 1 if any solution breaks the rules.
+
+import argparse
+import sys
+import time
+
+from encoder import placement_cells
+from solution import canonical_hash, check_solution, read_solutions
+from varmap import read_comments, read_sidecar, sidecar_placements
+
+def print_board(placed, rows, cols):
+    board = [[' ' for i in range(cols)] for i in range(rows)]
+    for word, o, r, c in placed:
+        for r2, c2, ch in placement_cells(word, (o, r, c)):
+            board[r2][c2] = ch
+    for row in board:
+        print(''.join(row))
+
+def open_output(path):
+    return sys.stdin if path == '-' else open(path)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Verify and deduplicate wordcross solutions')
+    parser.add_argument('cnf_filename', type=str, help='input DIMACS file')
+    parser.add_argument('outputs', nargs='*', default=['-'],
+                        help='solver outputs or forces (default: stdin)')
+    parser.add_argument('--rows', type=int,
+                        help='number of rows (default: from the CNF sidecar)')
+    parser.add_argument('--cols', type=int,
+                        help='number of columns (default: from the CNF sidecar)')
+    parser.add_argument('--wordfile',
+                        help='the words the CNF was generated for ' + \
+                        '(default: from the CNF sidecar)')
+    parser.add_argument('--lowerbound', type=int,
+                        help='the CNF only asks for this many words')
+    parser.add_argument('--dedup', action='store_true',
+                        help="don't print solutions that are the same " + \
+                        'puzzle as an earlier one')
+    parser.add_argument('--format', choices=['status','ascii','forces'],
+                        default='status',
+                        help='print a status line for each solution, or ' + \
+                        'print the valid ones (default: status)')
+    parser.add_argument('--varmap',
+                        help='the placement var sidecar ' + \
+                        '(default: next to the CNF)')
+    args = parser.parse_args()
+
+    vm = read_sidecar(args.cnf_filename, args.varmap)
+    if vm is not None:
+        rows, cols, placements = vm['rows'], vm['cols'], sidecar_placements(vm)
+        words = set(w for w, first, ps in vm['words'])
+    else:
+        rows, cols, placements = None, None, read_comments(args.cnf_filename)
+        words = set(w for w, o, r, c in placements.values())
+    if args.rows is not None: rows = args.rows
+    if args.cols is not None: cols = args.cols
+    if rows is None or cols is None:
+        parser.error('--rows and --cols are required without a CNF sidecar')
+    # Words that don't fit anywhere only show up in the sidecar or wordfile.
+    if args.wordfile is not None:
+        words = set(w.strip() for w in open(args.wordfile) if w.strip())
+
+    start = time.time()
+    seen = {}  # canonical hash -> the first solution with it
+    n = invalid = duplicates = printed = 0
+    for path in args.outputs:
+        with open_output(path) as f:
+            for placed in read_solutions(f, placements):
+                n += 1
+                problems = check_solution(placed, words, rows, cols,
+                                          args.lowerbound)
+                if problems:
+                    invalid += 1
+                    note = 'invalid: ' + '; '.join(problems)
+                    if args.format == 'status': print('%d: %s' % (n, note))
+                    else: sys.stderr.write('c solution %d is %s\n' % (n, note))
+                    continue
+                h = canonical_hash(placed)
+                if h in seen:
+                    duplicates += 1
+                    if args.format == 'status':
+                        print('%d: duplicate of %d' % (n, seen[h]))
+                    if args.dedup: continue
+                else:
+                    seen[h] = n
+                    if args.format == 'status': print('%d: ok %s' % (n, h[:16]))
+                if args.format == 'status': continue
+                if printed > 0: print()
+                printed += 1
+                if args.format == 'ascii': print_board(placed, rows, cols)
+                else:
+                    for p in sorted(placed): print('%s:%s(%d,%d)' % p)
+    sys.stderr.write('c %d solutions: %d invalid, %d duplicates, %d unique '
+                     'in %.2fs\n' % (n, invalid, duplicates, len(seen),
+                                     time.time() - start))
+    if invalid > 0: sys.exit(1)